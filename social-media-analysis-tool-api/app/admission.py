@@ -0,0 +1,261 @@
+# app/admission.py
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+
+class AdmissionRejected(Exception):
+    """Request cannot be admitted now; carries the HTTP status and Retry-After."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[int] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class Cost:
+    __slots__ = ("comments", "tokens", "small")
+
+    def __init__(self, comments: int, tokens: int, small: bool):
+        self.comments = comments
+        self.tokens = tokens
+        self.small = small
+
+
+class _ClientQuota:
+    __slots__ = ("allowance", "updated", "active")
+
+    def __init__(self, allowance: float):
+        self.allowance = allowance
+        self.updated = time.monotonic()
+        self.active = 0
+
+
+class AdmissionController:
+    """Cost-aware admission for the analysis endpoints.
+
+    Each request's cost is estimated up front (comments ~ memory, tokens ~ CPU)
+    and checked against a global in-flight budget:
+
+    - requests that fit, with nothing of equal or higher priority waiting, are
+      admitted at once; otherwise they wait in a bounded queue (small/interactive
+      requests first, background work last) for at most `max_wait` seconds
+    - large requests may only use `1 - small_reserve` of the budget, so small
+      requests always find room and their latency stays bounded; a request
+      bigger than that share holds all of it, i.e. runs without other large ones
+    - each client has a token-bucket quota of comments per minute and a cap on
+      concurrent requests; background work (scheduled refreshes) is charged
+      against the global budget only
+    - rejections carry a status (429 quota, 503 overloaded) and a Retry-After
+      estimate based on recently observed throughput
+    """
+
+    def __init__(self, max_inflight_comments: int = 60000, max_inflight_tokens: int = 3000000,
+                 max_request_comments: int = 20000, small_comments: int = 500,
+                 small_reserve: float = 0.2, max_queue: int = 32, max_wait: float = 30.0,
+                 client_comments_per_minute: int = 100000, client_max_concurrent: int = 2,
+                 tokens_per_comment: int = 40):
+        self.max_inflight_comments = max_inflight_comments
+        self.max_inflight_tokens = max_inflight_tokens
+        self.max_request_comments = max_request_comments
+        self.small_comments = small_comments
+        self.small_reserve = small_reserve
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.client_comments_per_minute = client_comments_per_minute
+        self.client_max_concurrent = client_max_concurrent
+        self.tokens_per_comment = tokens_per_comment
+
+        self._comments = 0
+        self._tokens = 0
+        self._large_comments = 0  # held by non-small requests, at most (1 - small_reserve) of the budget
+        self._large_tokens = 0
+        self._waiters: List[list] = []  # heap of [priority, seq, cost, future]
+        self._queued = 0
+        self._seq = itertools.count()
+        self._clients: Dict[str, _ClientQuota] = {}
+        self._pruned_at = time.monotonic()
+        self._rate = 200.0  # comments/s, EWMA of completed requests
+
+    # --- estimation ---
+    def _cost(self, comments: int, tokens: int) -> Cost:
+        return Cost(comments, tokens, comments <= self.small_comments)
+
+    def estimate_scrape(self, max_comments: int) -> Cost:
+        # fetch_all_comments splits max_comments across the posts by demand (allocate_budget)
+        # and trims to it before inference, however many posts there are
+        return self._cost(max_comments, max_comments * self.tokens_per_comment)
+
+    def estimate_csv(self, content_bytes: bytes) -> Cost:
+        # one comment per line, ~4 bytes per token; exact enough and needs no parsing
+        comments = content_bytes.count(b"\n") + 1
+        return self._cost(comments, max(len(content_bytes) // 4, comments))
+
+    def cap_scrape_comments(self, max_comments: int) -> int:
+        """Under load, degrade oversize scrapes to `max_request_comments` instead of queueing them.
+
+        On an idle node (nothing queued, and the request fits now) it runs in full.
+        """
+        if max_comments <= self.max_request_comments:
+            return max_comments
+        if not self._queued and self._fits(self._charge(self.estimate_scrape(max_comments))):
+            return max_comments
+        return self.max_request_comments
+
+    # --- admission ---
+    def _retry_after(self, comments: int) -> int:
+        backlog = self._comments + comments + sum(w[2].comments for w in self._waiters if w[3] is not None)
+        return max(1, min(300, math.ceil(backlog / max(self._rate, 1.0))))
+
+    def _check_client(self, client: str, cost: Cost) -> _ClientQuota:
+        rate = self.client_comments_per_minute / 60.0
+        now = time.monotonic()
+        self._prune_clients(now)
+        quota = self._clients.get(client)
+        if quota is None:
+            quota = self._clients[client] = _ClientQuota(self.client_comments_per_minute)
+        quota.allowance = min(self.client_comments_per_minute, quota.allowance + (now - quota.updated) * rate)
+        quota.updated = now
+        if quota.active >= self.client_max_concurrent:
+            raise AdmissionRejected(429, "Too many concurrent analysis requests for this client", self._retry_after(0))
+        if quota.allowance < cost.comments:
+            wait = math.ceil((cost.comments - quota.allowance) / rate)
+            raise AdmissionRejected(429, "Client comment quota exceeded", max(1, wait))
+        return quota
+
+    def _prune_clients(self, now: float, every: float = 60.0) -> None:
+        """Drop idle clients whose bucket has refilled; they are indistinguishable from new ones."""
+        if now - self._pruned_at < every:
+            return
+        self._pruned_at = now
+        rate = self.client_comments_per_minute / 60.0
+        idle = [
+            client for client, q in self._clients.items()
+            if not q.active and q.allowance + (now - q.updated) * rate >= self.client_comments_per_minute
+        ]
+        for client in idle:
+            del self._clients[client]
+
+    def _charge(self, cost: Cost) -> Cost:
+        """What a request holds while running: capped at its share, so oversize requests queue to run alone."""
+        share = 1.0 if cost.small else 1.0 - self.small_reserve
+        max_comments = int(self.max_inflight_comments * share)
+        max_tokens = int(self.max_inflight_tokens * share)
+        if cost.comments <= max_comments and cost.tokens <= max_tokens:
+            return cost
+        return Cost(min(cost.comments, max_comments), min(cost.tokens, max_tokens), cost.small)
+
+    def _fits(self, cost: Cost) -> bool:
+        if (self._comments + cost.comments > self.max_inflight_comments
+                or self._tokens + cost.tokens > self.max_inflight_tokens):
+            return False
+        if cost.small:
+            return True
+        share = 1.0 - self.small_reserve
+        return (self._large_comments + cost.comments <= self.max_inflight_comments * share
+                and self._large_tokens + cost.tokens <= self.max_inflight_tokens * share)
+
+    def _take(self, cost: Cost) -> None:
+        self._comments += cost.comments
+        self._tokens += cost.tokens
+        if not cost.small:
+            self._large_comments += cost.comments
+            self._large_tokens += cost.tokens
+
+    def _wake(self) -> None:
+        while self._waiters:
+            entry = self._waiters[0]
+            if entry[3] is None:  # abandoned (timed out)
+                heapq.heappop(self._waiters)
+                continue
+            if not self._fits(entry[2]):
+                break
+            heapq.heappop(self._waiters)
+            self._queued -= 1
+            self._take(entry[2])
+            entry[3].set_result(True)
+
+    async def _acquire(self, cost: Cost, priority: int) -> None:
+        if self._fits(cost) and not any(w[3] is not None and w[0] <= priority for w in self._waiters):
+            # nothing ahead of it: a full queue of larger (or background) work must not hold it up
+            self._take(cost)
+            return
+        if self._queued >= self.max_queue:
+            raise AdmissionRejected(503, "Analysis queue is full", self._retry_after(cost.comments))
+        fut = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), cost, fut]
+        heapq.heappush(self._waiters, entry)
+        self._queued += 1
+        self._wake()
+        try:
+            if not fut.done():
+                await asyncio.wait({fut}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            # client went away while queued
+            self._abandon(entry, cost)
+            raise
+        if not fut.done():
+            self._abandon(entry, cost)
+            raise AdmissionRejected(503, "Server busy, analysis request timed out in queue", self._retry_after(cost.comments))
+
+    def _abandon(self, entry: list, cost: Cost) -> None:
+        if entry[3].done():
+            # admitted in the meantime: give the budget back
+            self._release(cost)
+        else:
+            entry[3] = None
+            self._queued -= 1
+
+    def _release(self, cost: Cost) -> None:
+        self._comments -= cost.comments
+        self._tokens -= cost.tokens
+        if not cost.small:
+            self._large_comments -= cost.comments
+            self._large_tokens -= cost.tokens
+        self._wake()
+
+    def _observe(self, comments: int, elapsed: float) -> None:
+        if elapsed > 0 and comments:
+            self._rate = 0.8 * self._rate + 0.2 * (comments / elapsed)
+
+    @asynccontextmanager
+    async def admit(self, client: str, cost: Cost, background: bool = False):
+        """Hold `cost` of the global budget for the duration of the block.
+
+        `background` work skips the per-client quota and queues behind all
+        interactive requests.
+        """
+        charge = self._charge(cost)
+        quota = None if background else self._check_client(client, cost)
+        if quota is not None:
+            quota.active += 1
+        try:
+            await self._acquire(charge, 2 if background else 0 if cost.small else 1)
+        except BaseException:
+            if quota is not None:
+                quota.active -= 1
+            raise
+        if quota is not None:
+            quota.allowance -= cost.comments
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            if quota is not None:
+                quota.active -= 1
+            self._release(charge)
+            self._observe(cost.comments, time.monotonic() - started)
+
+    def status(self) -> Dict[str, float]:
+        return {
+            "inflight_comments": self._comments,
+            "inflight_tokens": self._tokens,
+            "queued": self._queued,
+            "clients": len(self._clients),
+            "observed_comments_per_second": round(self._rate, 1),
+        }
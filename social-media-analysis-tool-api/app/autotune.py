@@ -0,0 +1,217 @@
+# app/autotune.py
+"""Measure the fastest inference configuration on this host and persist it.
+
+    python -m app.autotune                      # tune with synthetic comments
+    python -m app.autotune --csv comments.csv   # tune with real texts (first column)
+
+Tuned: batch size, torch intra-op / inter-op threads, and whether the two
+pipelines run concurrently or one after the other. The result is stored per
+host + backend in AUTOTUNE_FILE (default models/autotune.json) and picked up by
+the API and workers at startup.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import torch
+
+from app.utils import chunk_list, predict_batch
+
+log = logging.getLogger(__name__)
+
+AUTOTUNE_FILE = os.getenv("AUTOTUNE_FILE", "models/autotune.json")
+
+# batch sizes within this fraction of the best throughput form the allowed range
+TUNED_RANGE_FRACTION = 0.8
+
+DEFAULT_CONFIG = {
+    "batch_size": 32,
+    "batch_size_min": 1,
+    "batch_size_max": 128,
+    "intra_op_threads": None,
+    "inter_op_threads": None,
+    "concurrent": True,
+}
+
+_WORDS = ("service price quality delivery great terrible slow fast good bad love hate "
+          "the a is was not very really order product store support staff app").split()
+
+
+def backend_key(device: int = -1) -> str:
+    backend = "cpu" if device < 0 else f"cuda:{device}"
+    return f"{socket.gethostname()}/{backend}/torch-{torch.__version__}"
+
+
+def load_config(device: int = -1, path: str = AUTOTUNE_FILE) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f).get(backend_key(device))
+    except (OSError, ValueError):
+        return None
+
+
+def save_config(config: Dict[str, Any], device: int = -1, path: str = AUTOTUNE_FILE) -> None:
+    try:
+        with open(path) as f:
+            all_configs = json.load(f)
+    except (OSError, ValueError):
+        all_configs = {}
+    all_configs[backend_key(device)] = config
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(all_configs, f, indent=2)
+    os.replace(tmp, path)
+
+
+def apply_threads(config: Dict[str, Any]) -> None:
+    """Apply tuned torch thread counts; inter-op can only be set before torch does parallel work."""
+    if config.get("intra_op_threads"):
+        torch.set_num_threads(int(config["intra_op_threads"]))
+    if config.get("inter_op_threads"):
+        try:
+            torch.set_num_interop_threads(int(config["inter_op_threads"]))
+        except RuntimeError as e:
+            log.warning(f"could not set inter-op threads: {e}")
+
+
+def clamp_batch_size(requested: Optional[int], config: Dict[str, Any]) -> int:
+    """Default to the tuned batch size; keep client-supplied sizes inside the tuned range."""
+    if requested is None:
+        return int(config["batch_size"])
+    return max(int(config["batch_size_min"]), min(int(config["batch_size_max"]), int(requested)))
+
+
+def synthetic_texts(n: int = 256, seed: int = 0) -> List[str]:
+    rnd = random.Random(seed)
+    # comment lengths skew short with a long tail, like real page comments
+    return [" ".join(rnd.choice(_WORDS) for _ in range(min(120, int(rnd.expovariate(1 / 18)) + 2))) for _ in range(n)]
+
+
+def _throughput(models, texts: Sequence[str], batch_size: int, concurrent: bool) -> float:
+    with contextlib.redirect_stdout(io.StringIO()):
+        # warm-up so allocator / kernel selection is not measured
+        predict_batch(models, list(texts[:batch_size]), concurrent=concurrent)
+        t0 = time.perf_counter()
+        for batch in chunk_list(list(texts), batch_size):
+            predict_batch(models, batch, concurrent=concurrent)
+        elapsed = time.perf_counter() - t0
+    return len(texts) / elapsed
+
+
+def _intra_candidates() -> List[int]:
+    cores = os.cpu_count() or 1
+    return sorted({max(1, cores // d) for d in (1, 2, 4)}, reverse=True)
+
+
+def measure(models, texts: Sequence[str], batch_sizes: Sequence[int] = (8, 16, 32, 64, 128),
+            intra_op_threads: Optional[Sequence[int]] = None) -> List[Dict[str, Any]]:
+    """Throughput (texts/s) for every batch size x intra-op threads x sequential/concurrent combination."""
+    results = []
+    original = torch.get_num_threads()
+    try:
+        for intra in intra_op_threads or _intra_candidates():
+            torch.set_num_threads(intra)
+            for concurrent in (False, True):
+                for bs in batch_sizes:
+                    tput = _throughput(models, texts, bs, concurrent)
+                    log.info(f"intra={intra} concurrent={concurrent} batch_size={bs}: {tput:.1f} texts/s")
+                    results.append({
+                        "batch_size": bs,
+                        "intra_op_threads": intra,
+                        "inter_op_threads": torch.get_num_interop_threads(),
+                        "concurrent": concurrent,
+                        "throughput": tput,
+                    })
+    finally:
+        torch.set_num_threads(original)
+    return results
+
+
+def best_config(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    best = max(results, key=lambda r: r["throughput"])
+    # allowed client range: batch sizes that stay close to the best, with the same threads/mode
+    near = [
+        r["batch_size"] for r in results
+        if r["intra_op_threads"] == best["intra_op_threads"]
+        and r["inter_op_threads"] == best["inter_op_threads"]
+        and r["concurrent"] == best["concurrent"]
+        and r["throughput"] >= TUNED_RANGE_FRACTION * best["throughput"]
+    ]
+    return {
+        "batch_size": best["batch_size"],
+        "batch_size_min": min(near),
+        "batch_size_max": max(near),
+        "intra_op_threads": best["intra_op_threads"],
+        "inter_op_threads": best["inter_op_threads"],
+        "concurrent": best["concurrent"],
+        "throughput": best["throughput"],
+        "measured_at": time.time(),
+    }
+
+
+def autotune(models, texts: Optional[Sequence[str]] = None, device: int = -1, save: bool = True) -> Dict[str, Any]:
+    """In-process tuning (inter-op threads stay at the process' current value)."""
+    config = best_config(measure(models, texts or synthetic_texts()))
+    if save:
+        save_config(config, device)
+    return config
+
+
+def _read_texts(path: str, limit: int) -> List[str]:
+    with open(path, newline="", encoding="utf-8", errors="ignore") as f:
+        texts = [row[0].strip() for row in csv.reader(f) if row and row[0].strip()]
+    return texts[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune inference batch size and torch threads for this host")
+    parser.add_argument("--sentiment-dir", default="models/sentiment")
+    parser.add_argument("--topics-dir", default="models/topics")
+    parser.add_argument("--device", type=int, default=-1, help="-1 for CPU, or GPU id")
+    parser.add_argument("--csv", help="CSV whose first column holds sample comments (default: synthetic)")
+    parser.add_argument("--samples", type=int, default=256)
+    parser.add_argument("--batch-sizes", default="8,16,32,64,128")
+    parser.add_argument("--inter-op", default="1,2", help="inter-op thread counts to try (one subprocess each)")
+    parser.add_argument("--measure-only", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if not args.measure_only:
+        # inter-op threads can only be set once per process: measure each value in its own process
+        results = []
+        for inter in [int(x) for x in args.inter_op.split(",") if x]:
+            cmd = [
+                sys.executable, "-m", "app.autotune", "--measure-only",
+                "--sentiment-dir", args.sentiment_dir, "--topics-dir", args.topics_dir,
+                "--device", str(args.device), "--samples", str(args.samples),
+                "--batch-sizes", args.batch_sizes, "--inter-op", str(inter),
+            ] + (["--csv", args.csv] if args.csv else [])
+            out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, text=True).stdout
+            results.extend(json.loads(out.strip().splitlines()[-1]))
+        config = best_config(results)
+        save_config(config, args.device)
+        print(json.dumps(config, indent=2))
+        print(f"saved to {AUTOTUNE_FILE} under {backend_key(args.device)}")
+        return
+
+    torch.set_num_interop_threads(int(args.inter_op))
+    from app.models import HFModels
+    models = HFModels(args.sentiment_dir, args.topics_dir, args.device).load()
+    texts = _read_texts(args.csv, args.samples) if args.csv else synthetic_texts(args.samples)
+    batch_sizes = [int(x) for x in args.batch_sizes.split(",") if x]
+    print(json.dumps(measure(models, texts, batch_sizes)))
+
+
+if __name__ == "__main__":
+    main()
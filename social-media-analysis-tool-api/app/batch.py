@@ -0,0 +1,162 @@
+# app/batch.py
+import json
+import math
+import sys
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+
+_encode_str = json.encoder.encode_basestring_ascii
+_NAN = float("nan")
+
+
+def _label_score(pred):
+    """Normalize one pipeline output to (label, score); (None, None) if unusable."""
+    # sometimes pipeline returns list of lists
+    if isinstance(pred, list):
+        pred = pred[0] if len(pred) == 1 else pred
+    if not isinstance(pred, dict):
+        return None, None
+    label = pred.get("label")
+    return (sys.intern(label) if isinstance(label, str) else label), float(pred.get("score", 0.0))
+
+
+def _json_value(v) -> str:
+    return "null" if v is None else _encode_str(v if isinstance(v, str) else str(v))
+
+
+def _json_float(v: float) -> str:
+    # float32 storage: 7 significant digits is all the precision there is
+    return "null" if math.isnan(v) else format(v, ".7g")
+
+
+class CommentBatch:
+    """Columnar container for comments as they flow scraper/CSV -> inference -> merge -> analytics.
+
+    One list per field instead of one dict per comment; predicted labels are
+    interned and confidences are float32 arrays (NaN = missing).
+    """
+
+    __slots__ = (
+        "comment_id", "post_id", "text", "author_id", "author_name", "created_time",
+        "sentiment", "sentiment_conf", "category", "category_conf",
+    )
+
+    def __init__(self):
+        self.comment_id: List[Optional[str]] = []
+        self.post_id: List[Optional[str]] = []
+        self.text: List[str] = []
+        self.author_id: List[Optional[str]] = []
+        self.author_name: List[Optional[str]] = []
+        self.created_time: List[Optional[str]] = []
+        self.sentiment: List[Optional[str]] = []
+        self.sentiment_conf = array("f")
+        self.category: List[Optional[str]] = []
+        self.category_conf = array("f")
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def append(self, comment_id: Optional[str], text: str, created_time: Optional[str] = None,
+               post_id: Optional[str] = None, author_id: Optional[str] = None, author_name: Optional[str] = None) -> None:
+        self.comment_id.append(comment_id)
+        self.text.append(text)
+        self.created_time.append(created_time)
+        self.post_id.append(post_id)
+        self.author_id.append(author_id)
+        self.author_name.append(author_name)
+
+    def extend(self, other: "CommentBatch") -> None:
+        for name in self.__slots__:
+            getattr(self, name).extend(getattr(other, name))
+
+    def dedupe(self) -> "CommentBatch":
+        """New batch keeping the first occurrence of each comment_id."""
+        seen = set()
+        keep = []
+        for i, cid in enumerate(self.comment_id):
+            if cid not in seen:
+                seen.add(cid)
+                keep.append(i)
+        if len(keep) == len(self):
+            return self
+        out = CommentBatch()
+        for name in self.__slots__:
+            col = getattr(self, name)
+            if len(col):
+                picked = [col[i] for i in keep]
+                getattr(out, name).extend(array("f", picked) if isinstance(col, array) else picked)
+        return out
+
+    def slice(self, start: int, end: int) -> "CommentBatch":
+        """New batch with rows [start, end)."""
+        out = CommentBatch()
+        for name in self.__slots__:
+            getattr(out, name).extend(getattr(self, name)[start:end])
+        return out
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[Dict[str, Any]]) -> "CommentBatch":
+        out = cls()
+        for r in rows:
+            out.append(r.get("comment_id"), r.get("text", ""), r.get("created_time"),
+                       r.get("post_id"), r.get("author_id"), r.get("author_name"))
+        return out
+
+    def set_predictions(self, sentiment_preds: List, topics_preds: List) -> "CommentBatch":
+        """Store model outputs (same order as the batch); `merge_model_outputs` semantics, no row copies."""
+        n = len(self)
+        self.sentiment = [None] * n
+        self.category = [None] * n
+        self.sentiment_conf = array("f", [_NAN]) * n
+        self.category_conf = array("f", [_NAN]) * n
+        for i, (s, t) in enumerate(zip(sentiment_preds, topics_preds)):
+            label, score = _label_score(s)
+            self.sentiment[i] = label
+            if score is not None:
+                self.sentiment_conf[i] = score
+            label, score = _label_score(t)
+            self.category[i] = label
+            if score is not None:
+                self.category_conf[i] = score
+        return self
+
+    def row(self, i: int) -> Dict[str, Any]:
+        """`CommentResult`-shaped dict for a single row (for callers that need one)."""
+        has_preds = bool(self.sentiment)
+        s_conf = self.sentiment_conf[i] if has_preds else _NAN
+        c_conf = self.category_conf[i] if has_preds else _NAN
+        return {
+            "comment_id": self.comment_id[i],
+            "text": self.text[i],
+            "sentiment": self.sentiment[i] if has_preds else None,
+            "sentiment_conf": None if math.isnan(s_conf) else s_conf,
+            "category": self.category[i] if has_preds else None,
+            "category_conf": None if math.isnan(c_conf) else c_conf,
+            "created_time": self.created_time[i],
+        }
+
+    def results_json(self) -> str:
+        """JSON array of `CommentResult` objects, written straight from the columns.
+
+        Skips per-row model validation, so the one field that can be missing
+        (`comment_id: str`) is checked here instead.
+        """
+        if None in self.comment_id:
+            raise ValueError(f"comment_id is required (row {self.comment_id.index(None)})")
+        if not self.sentiment:
+            return "[" + ",".join(
+                '{"comment_id":%s,"text":%s,"sentiment":null,"sentiment_conf":null,'
+                '"category":null,"category_conf":null,"created_time":%s}'
+                % (_json_value(cid), _encode_str(text), _json_value(ct))
+                for cid, text, ct in zip(self.comment_id, self.text, self.created_time)
+            ) + "]"
+        return "[" + ",".join(
+            '{"comment_id":%s,"text":%s,"sentiment":%s,"sentiment_conf":%s,'
+            '"category":%s,"category_conf":%s,"created_time":%s}'
+            % (_json_value(cid), _encode_str(text), _json_value(s), _json_float(sc),
+               _json_value(c), _json_float(cc), _json_value(ct))
+            for cid, text, s, sc, c, cc, ct in zip(
+                self.comment_id, self.text, self.sentiment, self.sentiment_conf,
+                self.category, self.category_conf, self.created_time,
+            )
+        ) + "]"
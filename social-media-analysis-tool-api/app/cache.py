@@ -0,0 +1,103 @@
+# app/cache.py
+import asyncio
+import hashlib
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class ResponseCache:
+    """In-memory TTL cache of serialized responses.
+
+    Payloads are stored zlib-compressed so that large analysis results (tens of
+    thousands of comments) stay cheap to keep around, optionally with a small
+    uncompressed `meta` value. Entries are evicted in LRU order once
+    `max_entries` is reached.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 128, compress_level: int = 6):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.compress_level = compress_level
+        self._entries: "OrderedDict[str, Tuple[float, bytes, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key: str) -> Optional[Tuple[bytes, Any]]:
+        """(payload, meta) for `key`, or None."""
+        if self.ttl <= 0:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, blob, meta = entry
+        if expires_at < time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return zlib.decompress(blob), meta
+
+    def set(self, key: str, payload: bytes, meta: Any = None) -> None:
+        if self.ttl <= 0:
+            return
+        blob = zlib.compress(payload, self.compress_level)
+        self._entries[key] = (time.monotonic() + self.ttl, blob, meta)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one computation.
+
+    The first caller for a key runs `fn`; callers arriving while it is still in
+    flight await the same future and get the same result (or exception).
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        fut = self._inflight.get(key)
+        if fut is not None:
+            # shield so one cancelled waiter does not cancel the shared work
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            result = await fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            # mark retrieved so an unwaited future does not log a warning
+            fut.exception()
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+
+def make_key(*parts: Any) -> str:
+    """Stable hash key from request parts (None and '' are kept distinct)."""
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(repr(p).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def token_digest(token: str) -> str:
+    """Digest of an access token, for keys that must not be shared across tokens."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
@@ -0,0 +1,139 @@
+# app/export.py
+import csv
+import io
+import math
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from app.batch import CommentBatch
+
+# same columns / formatting as the dashboard's client-side export (generateCsv.ts)
+COMMENT_COLUMNS = ["comment_id", "created_time", "sentiment", "sentiment_conf", "category", "category_conf", "text"]
+CATEGORY_COLUMNS = ["category", "total_comments", "positive_comments", "neutral_comments", "negative_comments"]
+
+BOM = "\ufeff"
+
+
+def _conf(v: float) -> str:
+    return "" if math.isnan(v) else f"{v:.4f}"
+
+
+def _writer(buf: io.StringIO):
+    return csv.writer(buf, lineterminator="\n")
+
+
+def iter_comments_csv(comments: CommentBatch, chunk_rows: int = 2000) -> Iterator[str]:
+    """CSV of analyzed comments, yielded `chunk_rows` rows at a time."""
+    buf = io.StringIO()
+    w = _writer(buf)
+    buf.write(BOM)
+    w.writerow(COMMENT_COLUMNS)
+    has_preds = bool(comments.sentiment)
+    for start in range(0, len(comments), chunk_rows):
+        end = min(start + chunk_rows, len(comments))
+        for i in range(start, end):
+            w.writerow((
+                comments.comment_id[i],
+                comments.created_time[i] or "",
+                comments.sentiment[i] if has_preds else "",
+                _conf(comments.sentiment_conf[i]) if has_preds else "",
+                comments.category[i] if has_preds else "",
+                _conf(comments.category_conf[i]) if has_preds else "",
+                comments.text[i],
+            ))
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def iter_categories_csv(analytics: Dict[str, Any]) -> Iterator[str]:
+    buf = io.StringIO()
+    w = _writer(buf)
+    buf.write(BOM)
+    w.writerow(CATEGORY_COLUMNS)
+    for c in analytics.get("categories_stats", []):
+        w.writerow([c[k] for k in CATEGORY_COLUMNS])
+    yield buf.getvalue()
+
+
+def gzip_stream(chunks: Iterable[str], level: int = 6) -> Iterator[bytes]:
+    """gzip-encode text chunks on the fly (constant memory regardless of export size)."""
+    z = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = z.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield z.flush()
+
+
+def encode_stream(chunks: Iterable[str]) -> Iterator[bytes]:
+    for chunk in chunks:
+        yield chunk.encode("utf-8")
+
+
+def write_xlsx(comments: CommentBatch, fileobj) -> None:
+    """Comments as an .xlsx workbook (requires the optional `openpyxl` package)."""
+    try:
+        from openpyxl import Workbook
+    except ImportError as e:
+        raise RuntimeError("XLSX export requires the `openpyxl` package (pip install openpyxl)") from e
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("comments")
+    ws.append(COMMENT_COLUMNS)
+    has_preds = bool(comments.sentiment)
+    for i in range(len(comments)):
+        s_conf = comments.sentiment_conf[i] if has_preds else math.nan
+        c_conf = comments.category_conf[i] if has_preds else math.nan
+        ws.append([
+            comments.comment_id[i],
+            comments.created_time[i],
+            comments.sentiment[i] if has_preds else None,
+            None if math.isnan(s_conf) else round(s_conf, 4),
+            comments.category[i] if has_preds else None,
+            None if math.isnan(c_conf) else round(c_conf, 4),
+            comments.text[i],
+        ])
+    wb.save(fileobj)
+
+
+def _pct(part: int, total: int) -> int:
+    return round(part / total * 100) if total else 0
+
+
+def build_report(page_id: Optional[str], comments: CommentBatch, analytics: Dict[str, Any],
+                 samples: int = 5) -> Dict[str, Any]:
+    """Pre-aggregated report data (what ReportDocument.tsx computes client-side)."""
+    total = analytics["total_comments"]
+
+    # monthly sentiment timeline, keyed YYYY-MM (created_time is ISO 8601)
+    timeline: Dict[str, Counter] = {}
+    dates = []
+    for created, sentiment in zip(comments.created_time, comments.sentiment or [None] * len(comments)):
+        if not created:
+            continue
+        dates.append(created)
+        sentiment = (sentiment or "").lower()
+        if sentiment in ("positive", "neutral", "negative"):
+            timeline.setdefault(created[:7], Counter())[sentiment] += 1
+
+    top_topics = sorted(analytics["categories_stats"], key=lambda c: c["total_comments"], reverse=True)[:3]
+    return {
+        "page_id": page_id,
+        "analytics": analytics,
+        "summary": {
+            "total_comments": total,
+            "positive_pct": _pct(analytics["positive_comments"], total),
+            "neutral_pct": _pct(analytics["neutral_comments"], total),
+            "negative_pct": _pct(analytics["negative_comments"], total),
+            "date_range": {"start": min(dates) if dates else None, "end": max(dates) if dates else None},
+            "top_topics": [t["category"] for t in top_topics],
+        },
+        "timeline": [
+            {"month": month, "positive": c["positive"], "neutral": c["neutral"], "negative": c["negative"]}
+            for month, c in sorted(timeline.items())
+        ],
+        "sample_comments": [comments.row(i) for i in range(min(samples, len(comments)))],
+    }
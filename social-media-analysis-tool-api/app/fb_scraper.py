@@ -2,9 +2,10 @@
 import re
 import math
 import asyncio
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from urllib.parse import urlparse, parse_qs
 import httpx
+from app.batch import CommentBatch
 
 FB_API_VERSION = "v19.0"
 FB_API_BASE = f"https://graph.facebook.com/{FB_API_VERSION}"
@@ -60,12 +61,16 @@ def sanitize_text(s: Optional[str]) -> str:
     s = re.sub(r"\s+", " ", s).strip()
     return s
 
-async def _fb_get(client: httpx.AsyncClient, url: str, params: Optional[dict] = None, retries: int = 3) -> Dict[str, Any]:
+async def _fb_get(client: httpx.AsyncClient, url: str, params: Optional[dict] = None, retries: int = 3,
+                  stats: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
     """
     Performs GET with basic retry & backoff for rate limits.
     `url` can be a full url (paging.next) or a path like '/{page_id}/posts'
+    Every HTTP request made (retries included) is counted in stats["requests"] when given.
     """
     full_url = url if url.startswith("http") else FB_API_BASE + url
+    if stats is not None:
+        stats["requests"] = stats.get("requests", 0) + 1
 
     try:
         r = await client.get(full_url, params=params, timeout=30.0)
@@ -104,14 +109,14 @@ async def _fb_get(client: httpx.AsyncClient, url: str, params: Optional[dict] =
         if status == 429 or err_code in (4, 613):
             if retries > 0:
                 await asyncio.sleep(2 ** (4 - retries))
-                return await _fb_get(client, url, params=params, retries=retries - 1)
+                return await _fb_get(client, url, params=params, retries=retries - 1, stats=stats)
             raise RateLimitError(message)
 
         # server-side errors
         if status >= 500:
             if retries > 0:
                 await asyncio.sleep(2 ** (4 - retries))
-                return await _fb_get(client, url, params=params, retries=retries - 1)
+                return await _fb_get(client, url, params=params, retries=retries - 1, stats=stats)
             raise ServerError(message)
 
         # fallback for other Graph API errors
@@ -142,12 +147,12 @@ async def _fb_get(client: httpx.AsyncClient, url: str, params: Optional[dict] =
         if status == 429 or err_code in (4, 613):
             if retries > 0:
                 await asyncio.sleep(2 ** (4 - retries))
-                return await _fb_get(client, url, params=params, retries=retries - 1)
+                return await _fb_get(client, url, params=params, retries=retries - 1, stats=stats)
             raise RateLimitError(message)
         if status >= 500:
             if retries > 0:
                 await asyncio.sleep(2 ** (4 - retries))
-                return await _fb_get(client, url, params=params, retries=retries - 1)
+                return await _fb_get(client, url, params=params, retries=retries - 1, stats=stats)
             raise ServerError(message)
 
         raise GraphAPIError({"status": status, "message": message})
@@ -156,24 +161,26 @@ async def _fb_get(client: httpx.AsyncClient, url: str, params: Optional[dict] =
     return data
 
 # --- Graph helpers ---
-async def resolve_page_id(page: str, access_token: str) -> str:
+async def resolve_page_id(page: str, access_token: str, stats: Optional[Dict[str, int]] = None) -> str:
     page_norm = normalize_page(page)
     if page_norm.isdigit():
         return page_norm
     async with httpx.AsyncClient() as client:
-        data = await _fb_get(client, f"/{page_norm}", params={"fields": "id", "access_token": access_token})
+        data = await _fb_get(client, f"/{page_norm}", params={"fields": "id", "access_token": access_token}, stats=stats)
         if "id" not in data:
             raise ValueError("Could not resolve page id from: " + page)
         return str(data["id"])
 
 async def fetch_posts(client: httpx.AsyncClient, page_id: str, access_token: str,
-                      limit: Optional[int] = None, since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+                      limit: Optional[int] = None, since: Optional[str] = None, until: Optional[str] = None,
+                      stats: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
     """Fetch posts for a page.
 
     If `limit` is None the function will page through all available posts (requesting up to 100 per request).
     If `limit` is provided the total posts returned will be capped to that value.
     """
-    fields = "id,created_time,message,permalink_url"
+    # comment totals come back with the posts so comment budgets can follow demand
+    fields = "id,created_time,message,permalink_url,comments.filter(stream).limit(0).summary(total_count)"
     # When limit is None, request 100 per page to be efficient; otherwise request up to min(limit, 100)
     params = {"fields": fields, "access_token": access_token}
     if limit is None:
@@ -186,7 +193,7 @@ async def fetch_posts(client: httpx.AsyncClient, page_id: str, access_token: str
     url = f"/{page_id}/posts"
     posts: List[Dict[str, Any]] = []
     while True:
-        data = await _fb_get(client, url, params=params)
+        data = await _fb_get(client, url, params=params, stats=stats)
         posts.extend(data.get("data", []))
         # stop if we reached the requested limit (when provided)
         if limit is not None and len(posts) >= limit:
@@ -199,92 +206,188 @@ async def fetch_posts(client: httpx.AsyncClient, page_id: str, access_token: str
     return posts if limit is None else posts[:limit]
 
 async def fetch_comments_for_post(client: httpx.AsyncClient, post_id: str, access_token: str,
-                                  max_comments: Optional[int] = None) -> List[Dict[str, Any]]:
-    """Fetch comments for a single post.
+                                  max_comments: Optional[int] = None, after: Optional[str] = None,
+                                  stats: Optional[Dict[str, int]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Fetch comments for a single post, starting at cursor `after` (None = from the start).
 
-    If `max_comments` is None the function will page through all available comments (requesting up to 100 per request).
-    If `max_comments` is provided the total comments returned will be capped to that value.
+    If `max_comments` is None the function will page through all remaining comments (requesting up to 100 per request).
+    If `max_comments` is provided it stops once at least that many were fetched; pages are sized by `page_size`,
+    so it may return up to MIN_PAGE_SIZE - 1 more.
+
+    Returns (comments, after): the cursor to continue from, or None once the post has no more comments.
     """
     fields = "id,from,message,created_time"
-    params = {"fields": fields, "access_token": access_token, "filter": "stream"}
-    if max_comments is None:
-        params["limit"] = 100
-    else:
-        params["limit"] = min(max_comments, 100)
-    url = f"/{post_id}/comments"
     comments: List[Dict[str, Any]] = []
     while True:
-        data = await _fb_get(client, url, params=params)
+        want = GRAPH_PAGE_MAX if max_comments is None else page_size(max_comments - len(comments))
+        params = {"fields": fields, "access_token": access_token, "filter": "stream", "limit": want}
+        if after:
+            params["after"] = after
+        data = await _fb_get(client, f"/{post_id}/comments", params=params, stats=stats)
         comments.extend(data.get("data", []))
-        # stop if we reached the requested cap (when provided)
-        if max_comments is not None and len(comments) >= max_comments:
-            break
-        next_url = data.get("paging", {}).get("next")
-        if not next_url:
+        paging = data.get("paging") or {}
+        after = (paging.get("cursors") or {}).get("after") if paging.get("next") else None
+        # stop when the post is exhausted or we reached the requested cap (when provided)
+        if after is None or (max_comments is not None and len(comments) >= max_comments):
+            return comments, after
+
+# --- Comment budget allocation ---
+GRAPH_PAGE_MAX = 100
+# smallest page worth a round trip; a post needing fewer comments fetches this many anyway
+MIN_PAGE_SIZE = 25
+
+
+def comment_total(post: Dict[str, Any]) -> Optional[int]:
+    """Total comment count from the `comments.summary(total_count)` expansion, if present."""
+    summary = (post.get("comments") or {}).get("summary") or {}
+    total = summary.get("total_count")
+    return int(total) if isinstance(total, int) else None
+
+
+def allocate_budget(budget: int, demands: List[int]) -> List[int]:
+    """Split `budget` across posts in proportion to `demands`, never above a post's demand.
+
+    Uses largest-remainder rounding; anything left over because some posts are
+    capped at their demand is handed to the posts that still want more.
+    """
+    alloc = [0] * len(demands)
+    remaining = budget
+    active = [i for i, d in enumerate(demands) if d > 0]
+    while remaining > 0 and active:
+        total = sum(demands[i] - alloc[i] for i in active)
+        if total <= remaining:
+            for i in active:
+                alloc[i] = demands[i]
+            remaining -= total
             break
-        url = next_url
-        params = None
-    return comments if max_comments is None else comments[:max_comments]
+        shares = [(i, remaining * (demands[i] - alloc[i]) / total) for i in active]
+        given = 0
+        for i, share in shares:
+            alloc[i] += int(share)
+            given += int(share)
+        # largest remainders get the leftover units
+        for i, share in sorted(shares, key=lambda x: x[1] - int(x[1]), reverse=True)[:remaining - given]:
+            alloc[i] += 1
+        remaining = 0
+    return alloc
+
+
+def page_size(want: int) -> int:
+    """Graph page size for `want` more comments: full pages, no tiny tail requests."""
+    if want <= GRAPH_PAGE_MAX:
+        return max(want, MIN_PAGE_SIZE)
+    pages = math.ceil(want / GRAPH_PAGE_MAX)
+    # e.g. 130 -> 2 x 65 rather than 100 + 30; same request count, no tiny tail
+    return min(GRAPH_PAGE_MAX, max(MIN_PAGE_SIZE, math.ceil(want / pages)))
+
+
+class _PostComments:
+    __slots__ = ("post_id", "demand", "comments", "after", "exhausted", "failed", "target")
+
+    def __init__(self, post_id: str, demand: Optional[int]):
+        self.post_id = post_id
+        self.demand = demand
+        self.comments = CommentBatch()
+        self.after: Optional[str] = None
+        self.exhausted = False
+        self.failed = False
+        self.target = 0  # share of the budget from the latest round
+
 
 # --- Top-level orchestrator ---
 async def fetch_all_comments(page: str, access_token: str,
                              max_posts: int = 10, max_comments: int = 500,
                              since: Optional[str] = None, until: Optional[str] = None,
-                             concurrency: int = 3) -> Dict[str, Any]:
+                             concurrency: int = 3, max_rounds: int = 4) -> Dict[str, Any]:
     """
-    Returns: { page_id, posts_scanned, total_fetched, comments: [ {comment_id, post_id, text, author_id, author_name, created_time} ] }
+    `max_comments` is split across posts in proportion to their comment counts
+    (from `comments.summary(total_count)`). Posts that run out early (or whose
+    comments sanitize to nothing) free their budget, which is reallocated to
+    posts that still have comments in up to `max_rounds` rounds.
+
+    graph_requests counts every Graph API request made, retries included.
+
+    Returns: { page_id, posts_scanned, total_fetched, graph_requests, requests_per_comment,
+               comments: CommentBatch(comment_id, post_id, text, author_id, author_name, created_time) }
     """
+    stats = {"requests": 0}
+
     async with httpx.AsyncClient() as client:
-        page_id = await resolve_page_id(page, access_token)
-        posts = await fetch_posts(client, page_id, access_token, limit=max_posts, since=since, until=until)
+        page_id = await resolve_page_id(page, access_token, stats=stats)
+        posts = await fetch_posts(client, page_id, access_token, limit=max_posts, since=since, until=until, stats=stats)
         posts_scanned = len(posts)
 
         if posts_scanned == 0:
-            return {"page_id": page_id, "posts_scanned": 0, "total_fetched": 0, "comments": []}
+            return {"page_id": page_id, "posts_scanned": 0, "total_fetched": 0,
+                    "graph_requests": stats["requests"], "requests_per_comment": None, "comments": CommentBatch()}
 
-        per_post = max(1, math.ceil(max_comments / posts_scanned))
+        states = [_PostComments(p.get("id"), comment_total(p)) for p in posts]
         sem = asyncio.Semaphore(concurrency)
 
-        async def _fetch_for_post(post):
+        async def _fetch_for_post(state: _PostComments, target: int):
             async with sem:
-                pid = post.get("id")
+                pid = state.post_id
                 try:
-                    raw = await fetch_comments_for_post(client, pid, access_token, max_comments=per_post)
+                    # repeat while comments that sanitize to nothing leave the post short of its target
+                    while len(state.comments) < target and not state.exhausted:
+                        raw, state.after = await fetch_comments_for_post(
+                            client, pid, access_token, max_comments=target - len(state.comments),
+                            after=state.after, stats=stats,
+                        )
+                        state.exhausted = state.after is None
+                        for c in raw:
+                            text = sanitize_text(c.get("message"))
+                            # comments without an id cannot be returned (CommentResult.comment_id is required)
+                            if not text or not c.get("id"):
+                                continue
+                            author = c.get("from") or {}
+                            state.comments.append(c.get("id"), text, c.get("created_time"),
+                                                  post_id=pid, author_id=author.get("id"), author_name=author.get("name"))
                 except Exception as e:
-                    # log & return empty list for this post
+                    # log & keep whatever this post already returned
                     print(f"[warn] failed comments for post {pid}: {e}")
-                    return []
-                out = []
-                for c in raw:
-                    text = sanitize_text(c.get("message"))
-                    if not text:
-                        continue
-                    out.append({
-                        "comment_id": c.get("id"),
-                        "post_id": pid,
-                        "text": text,
-                        "author_id": (c.get("from") or {}).get("id"),
-                        "author_name": (c.get("from") or {}).get("name"),
-                        "created_time": c.get("created_time")
-                    })
-                return out
-
-        tasks = [asyncio.create_task(_fetch_for_post(p)) for p in posts]
-        results = await asyncio.gather(*tasks)
-        flat = [item for sub in results for item in sub]
+                    state.failed = True
+
+        for _ in range(max_rounds):
+            # closed posts keep what they got of their last share; the rest of the budget is reallocated
+            for st in states:
+                if st.exhausted or st.failed or st.demand == 0:
+                    st.target = min(len(st.comments), st.target)
+            open_ = [st for st in states if not (st.exhausted or st.failed or st.demand == 0)]
+            # demand: known total, or (unknown / underestimated) "at least one more page"
+            demands = [
+                len(st.comments) + GRAPH_PAGE_MAX if st.demand is None or st.demand <= len(st.comments) else st.demand
+                for st in open_
+            ]
+            remaining = max_comments - sum(st.target for st in states if st not in open_)
+            for st, t in zip(open_, allocate_budget(remaining, demands)):
+                st.target = t
+            todo = [(st, st.target) for st in open_ if st.target > len(st.comments)]
+            if not todo:
+                break
+            await asyncio.gather(*(_fetch_for_post(st, t) for st, t in todo))
+            if sum(len(st.comments) for st in states) >= max_comments:
+                break
+
+        # final cut: each post keeps up to its share; page rounding overfetch fills any remaining budget
+        keep = [min(len(st.comments), st.target) for st in states]
+        extra = allocate_budget(max_comments - sum(keep), [len(st.comments) - k for st, k in zip(states, keep)])
+        keep = [k + e for k, e in zip(keep, extra)]
+        flat = CommentBatch()
+        for st, n in zip(states, keep):
+            if n < len(st.comments):
+                st.comments = st.comments.slice(0, n)
+            flat.extend(st.comments)
 
         # dedupe by comment_id, preserve first occurrence
-        seen = {}
-        unique = []
-        for c in flat:
-            cid = c["comment_id"]
-            if cid not in seen:
-                seen[cid] = True
-                unique.append(c)
+        unique = flat.dedupe()
 
+        requests = stats["requests"]
         return {
             "page_id": page_id,
             "posts_scanned": posts_scanned,
             "total_fetched": len(unique),
+            "graph_requests": requests,
+            "requests_per_comment": round(requests / len(unique), 4) if len(unique) else None,
             "comments": unique
         }
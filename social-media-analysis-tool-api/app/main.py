@@ -1,12 +1,33 @@
 # app/main.py
+import asyncio
 import csv
+import json
+import os
+import secrets
+import tempfile
 from pathlib import Path
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from typing import Optional
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from app.schemas import ScrapeRequest, AnalyzeResponse, CommentResult, AnalyzeCsvRequest
-from app.fb_scraper import fetch_all_comments
+from fastapi.responses import StreamingResponse
+from app.schemas import (
+    ScrapeRequest, AnalyzeResponse, AnalyzeCsvRequest,
+    MonitorPage, MonitorPagesRequest, MonitorPageStatus,
+)
+from app.fb_scraper import fetch_all_comments, normalize_page
 from app.models import get_models
-from app.utils import analyze_comments
+from app.utils import analyze_comments, generate_analytics
+from app.batch import CommentBatch
+from app.cache import ResponseCache, SingleFlight, make_key, content_hash, token_digest
+from app.store import ResultStore, AnalysisStore
+from app.export import (
+    iter_comments_csv, iter_categories_csv, gzip_stream, encode_stream, write_xlsx, build_report,
+)
+from app.scheduler import PageScheduler
+from app.workqueue import make_queue, analyze_comments_queued
+from app import autotune
+from app.admission import AdmissionController, AdmissionRejected, Cost
 import logging
 
 log = logging.getLogger("uvicorn.error")
@@ -20,27 +41,211 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Analysis-Id", "X-Admission-Degraded", "Retry-After"],
 )
 
 # load models once at startup
 MODELS = None
 
+# batch size / thread / pipeline-concurrency settings; tuned per host (python -m app.autotune)
+TUNING = dict(autotune.DEFAULT_CONFIG)
+
+# identical requests share one in-flight run; finished responses are memoized briefly
+RESPONSE_CACHE = ResponseCache(
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "60")),
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "128")),
+)
+INFLIGHT = SingleFlight()
+
+# completed analyses kept (columnar) for server-side exports, addressed by a random analysis_id
+# (never the cache key, which anyone could compute from the request parameters)
+ANALYSES = AnalysisStore(
+    ttl=float(os.getenv("EXPORT_TTL", "3600")),
+    max_entries=int(os.getenv("EXPORT_MAX_ANALYSES", "32")),
+)
+
+def _response_body(page_id, comments: CommentBatch, analytics, analysis_id: Optional[str] = None) -> bytes:
+    """Serialize an `AnalyzeResponse` straight from the comment columns (no per-row models)."""
+    return (
+        '{"page_id":%s,"analysis_id":%s,"comments_analyzed":%s,"analytics":%s}'
+        % (json.dumps(page_id), json.dumps(analysis_id), comments.results_json(),
+           json.dumps(analytics, separators=(",", ":")))
+    ).encode("utf-8")
+
+def _without_analysis_id(body: bytes, analysis_id: str) -> bytes:
+    # `"analysis_id":` only occurs unescaped as the key written by _response_body
+    return body.replace(b'"analysis_id":%s,' % json.dumps(analysis_id).encode("utf-8"), b'"analysis_id":null,', 1)
+
+# cost-based admission / backpressure; cache hits and coalesced followers are not charged.
+# under load, scrapes above ADMISSION_MAX_REQUEST_COMMENTS are degraded to that many comments
+ADMISSION = AdmissionController(
+    max_inflight_comments=int(os.getenv("ADMISSION_MAX_INFLIGHT_COMMENTS", "60000")),
+    max_inflight_tokens=int(os.getenv("ADMISSION_MAX_INFLIGHT_TOKENS", "3000000")),
+    max_request_comments=int(os.getenv("ADMISSION_MAX_REQUEST_COMMENTS", "20000")),
+    small_comments=int(os.getenv("ADMISSION_SMALL_COMMENTS", "500")),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "32")),
+    max_wait=float(os.getenv("ADMISSION_MAX_WAIT", "30")),
+    client_comments_per_minute=int(os.getenv("CLIENT_COMMENTS_PER_MINUTE", "100000")),
+    client_max_concurrent=int(os.getenv("CLIENT_MAX_CONCURRENT", "2")),
+)
+
+def _client_id(request: Request) -> str:
+    # quotas are keyed on the peer address; a client-supplied id would let callers mint fresh quotas at will
+    return request.client.host if request.client else "anonymous"
+
+async def _cached_analysis(key: str, compute, client: str, cost: Cost, background: bool = False):
+    """(analysis_id, response body) for `key` from the response cache, or from one `compute` run
+    shared by all concurrent callers.
+
+    `compute` returns (page_id, CommentBatch, analytics) and only runs once admitted.
+    Each completed interactive run gets a fresh random analysis id for the export
+    endpoints; `background` runs are not kept for export (analysis_id None), so
+    interactive callers do not reuse them.
+    """
+    while True:
+        entry = RESPONSE_CACHE.get_entry(key)
+        if entry is not None and (entry[1] is not None or background):
+            payload, analysis_id = entry
+            return analysis_id, payload
+        led = False
+
+        async def _run():
+            nonlocal led
+            led = True
+            async with ADMISSION.admit(client, cost, background=background):
+                page_id, comments, analytics = await compute()
+            if analytics is None:
+                analytics = generate_analytics(comments)
+            analysis_id = None
+            if not background:
+                # scheduled refreshes would crowd dashboard users' analyses out of the export store
+                analysis_id = secrets.token_urlsafe(24)
+                ANALYSES.put(analysis_id, page_id, comments, analytics)
+            body = _response_body(page_id, comments, analytics, analysis_id=analysis_id)
+            RESPONSE_CACHE.set(key, body, analysis_id)
+            return analysis_id, body
+
+        try:
+            analysis_id, payload = await INFLIGHT.do(key, _run)
+        except AdmissionRejected as e:
+            if not led:
+                # the leader was turned away for its own reasons (its quota, its wait): try again as ourselves
+                continue
+            retry = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+            raise HTTPException(status_code=e.status_code, detail=e.detail, headers=retry)
+        if analysis_id is None and not background:
+            # joined a scheduled refresh: run again for an exportable result
+            continue
+        return analysis_id, payload
+
+async def _cached_json(key: str, compute, client: str, cost: Cost, headers: Optional[dict] = None) -> Response:
+    analysis_id, payload = await _cached_analysis(key, compute, client, cost)
+    return Response(content=payload, media_type="application/json", headers={**(headers or {}), "X-Analysis-Id": analysis_id})
+
+# inference is CPU bound: run it off the event loop, a bounded number at a time.
+# small (interactive) runs get their own slot so they never queue behind a 50k-row batch.
+INFERENCE_SLOTS = asyncio.Semaphore(int(os.getenv("INFERENCE_CONCURRENCY", "1")))
+INTERACTIVE_SLOTS = asyncio.Semaphore(int(os.getenv("INTERACTIVE_INFERENCE_CONCURRENCY", "1")))
+
+# work-queue mode: when set, comments go to inference workers (`python -m app.worker`) in tasks
+# of WORK_QUEUE_TASK_SIZE; each worker predicts a task in batches of its own tuned batch size
+WORK_QUEUE_URL = os.getenv("WORK_QUEUE_URL")
+WORK_QUEUE = make_queue(WORK_QUEUE_URL) if WORK_QUEUE_URL else None
+WORK_QUEUE_TASK_SIZE = int(os.getenv("WORK_QUEUE_TASK_SIZE", "256"))
+
+async def _run_analysis(comments: CommentBatch, batch_size: int):
+    if WORK_QUEUE is not None:
+        # batch_size is this (untuned, model-less) host's; the workers use their own
+        return await analyze_comments_queued(
+            WORK_QUEUE, comments, batch_size=WORK_QUEUE_TASK_SIZE,
+            timeout=float(os.getenv("WORK_QUEUE_TIMEOUT", "600")),
+        )
+    slots = INTERACTIVE_SLOTS if len(comments) <= ADMISSION.small_comments else INFERENCE_SLOTS
+    async with slots:
+        return await run_in_threadpool(analyze_comments, MODELS, comments, batch_size, TUNING["concurrent"])
+
+# scheduled monitoring of many pages; pages, refresh times and the latest result per page
+# are kept in RESULT_STORE (SQLite, survives restarts)
+RESULT_STORE = ResultStore(os.getenv("MONITOR_DB", "monitor.db"))
+
+async def _monitor_page(spec: MonitorPage):
+    req = ScrapeRequest(
+        graph_api_key=spec.graph_api_key,
+        page=spec.page,
+        max_posts=spec.max_posts,
+        max_comments=spec.max_comments,
+    )
+    cost = ADMISSION.estimate_scrape(req.max_comments)
+    # same cache / single-flight path as /scrape-analyze, so a refresh reuses a dashboard request's
+    # run for the same page; scheduled refreshes queue behind interactive requests
+    analysis_id, payload = await _cached_analysis(
+        _scrape_key(req), lambda: _scrape_analyze(req), "scheduler", cost, background=True
+    )
+    # the export id belongs to whoever ran the analysis; monitor results are served without it
+    return _without_analysis_id(payload, analysis_id) if analysis_id else payload
+
+SCHEDULER = PageScheduler(
+    _monitor_page,
+    RESULT_STORE,
+    max_concurrency=int(os.getenv("MONITOR_MAX_CONCURRENCY", "8")),
+    max_per_token=int(os.getenv("MONITOR_MAX_PER_TOKEN", "2")),
+    first_run_jitter=float(os.getenv("MONITOR_FIRST_RUN_JITTER", "300")),
+)
+
 @app.on_event("startup")
 async def startup_event():
     global MODELS
-    MODELS = get_models(
-        sentiment_dir="models/sentiment",
-        topics_dir="models/topics",
-        device=-1  # -1 means CPU
-    )
-    log.info("Models loaded and ready")
+    tuned = autotune.load_config(device=-1)
+    if tuned:
+        TUNING.update(tuned)
+        autotune.apply_threads(TUNING)
+        log.info(f"Using tuned inference config: {tuned}")
+    if WORK_QUEUE is None:
+        MODELS = get_models(
+            sentiment_dir="models/sentiment",
+            topics_dir="models/topics",
+            device=-1  # -1 means CPU
+        )
+        log.info("Models loaded and ready")
+        if not tuned and os.getenv("AUTOTUNE_ON_STARTUP") == "1":
+            log.info("No tuned config for this host; running autotune")
+            TUNING.update(await run_in_threadpool(autotune.autotune, MODELS))
+            autotune.apply_threads(TUNING)
+            log.info(f"Autotune done: {TUNING}")
+    else:
+        log.info(f"Work-queue mode: inference delegated to workers on {WORK_QUEUE_URL}")
+    await SCHEDULER.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await SCHEDULER.stop()
 
 @app.get("/health")
 async def health():
-    return {"ok": True}
+    return {"ok": True, "admission": ADMISSION.status()}
 
 @app.post("/scrape-analyze", response_model=AnalyzeResponse)
-async def scrape_analyze(req: ScrapeRequest):
+async def scrape_analyze(req: ScrapeRequest, request: Request):
+    headers = None
+    capped = ADMISSION.cap_scrape_comments(req.max_comments)
+    if capped < req.max_comments:
+        # degrade rather than reject: analyze fewer comments, and say so
+        headers = {"X-Admission-Degraded": f"max_comments={capped}"}
+        req = ScrapeRequest(
+            graph_api_key=req.graph_api_key, page=req.page, max_posts=req.max_posts,
+            max_comments=capped, since=req.since, until=req.until,
+        )
+    key = _scrape_key(req)
+    cost = ADMISSION.estimate_scrape(req.max_comments)
+    return await _cached_json(key, lambda: _scrape_analyze(req), _client_id(request), cost, headers)
+
+def _scrape_key(req: ScrapeRequest) -> str:
+    # what a scrape returns depends on what the token may see (and whether it is valid at all):
+    # results are cached and coalesced per token, never shared across tokens
+    return make_key("scrape-analyze", token_digest(req.graph_api_key), normalize_page(req.page), req.since, req.until,
+                    req.max_posts, req.max_comments)
+
+async def _scrape_analyze(req: ScrapeRequest):
     try:
         # 1) fetch comments
         scraped = await fetch_all_comments(
@@ -55,54 +260,47 @@ async def scrape_analyze(req: ScrapeRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Scraper error: {e}")
 
-    comments = scraped.get("comments", [])
-    if not comments:
+    log.info(
+        f"Scraped {scraped['total_fetched']} comments from {scraped['posts_scanned']} posts of page {scraped['page_id']} "
+        f"with {scraped['graph_requests']} Graph requests ({scraped['requests_per_comment']} per comment)"
+    )
+    comments = scraped["comments"]
+    if not len(comments):
         # Ensure response_model contract with empty analytics
-        return {
-            "page_id": scraped.get("page_id"),
-            "comments_analyzed": [],
-            "analytics": {
-                "total_comments": 0,
-                "positive_comments": 0,
-                "negative_comments": 0,
-                "neutral_comments": 0,
-                "categories_stats": [],
-            },
-        }
-
-    # 2) build comments_meta (list of dicts with id + text + created_time)
-    comments_meta = [{"comment_id": c.get("comment_id"), "text": c.get("text", ""), "created_time": c.get("created_time")} for c in comments]
-
-    # 3) run analysis
+        return scraped.get("page_id"), comments, None
+
+    # 2) run analysis (the scraped CommentBatch goes straight to inference)
     try:
-        merged, analytics = analyze_comments(MODELS, comments_meta, batch_size=32)
+        merged, analytics = await _run_analysis(comments, batch_size=TUNING["batch_size"])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Model inference error: {e}")
 
-    # 4) format response
-    results = [CommentResult(**m) for m in merged]
-    return {
-        "page_id": scraped.get("page_id"), 
-        "comments_analyzed": results,
-        "analytics": analytics
-    }
+    # 3) format response
+    return scraped.get("page_id"), merged, analytics
 
 @app.post("/analyze-csv", response_model=AnalyzeResponse)
 async def analyze_csv(
+    request: Request,
     file: UploadFile = File(...),
-    batch_size: int = Form(32),
+    batch_size: Optional[int] = Form(None),
 ):
     """Accept a CSV file upload and analyze its comments.
     
-    This endpoint accepts form data with a CSV file and optional batch_size parameter.
+    This endpoint accepts form data with a CSV file and optional batch_size parameter
+    (defaults to the tuned batch size and is clamped to the tuned range).
     """
+    content_bytes = await file.read()
+    batch_size = autotune.clamp_batch_size(batch_size, TUNING)
+    key = make_key("analyze-csv", content_hash(content_bytes), batch_size)
+    cost = ADMISSION.estimate_csv(content_bytes)
+    return await _cached_json(key, lambda: _analyze_csv(content_bytes, batch_size), _client_id(request), cost)
 
+async def _analyze_csv(content_bytes: bytes, batch_size: int):
     try:
-        content_bytes = await file.read()
         text = content_bytes.decode("utf-8", errors="ignore")
 
         # Use csv module to read; detect header by checking the first line
-        comments_meta = []
+        comments = CommentBatch()
         reader = csv.reader(text.splitlines())
         rows = list(reader)
         if not rows:
@@ -130,18 +328,14 @@ async def analyze_csv(
                 if not comment_text:  # Skip empty comments
                     continue
                     
-                comment_data = {
-                    "comment_id": row[comment_id_idx].strip() if len(row) > comment_id_idx else f"csv_{len(comments_meta)+1}",
-                    "text": comment_text
-                }
+                comment_id = row[comment_id_idx].strip() if len(row) > comment_id_idx else f"csv_{len(comments)+1}"
                 
                 # Add created_time if available
+                created_time = None
                 if created_time_idx >= 0 and len(row) > created_time_idx:
-                    created_time = row[created_time_idx].strip()
-                    if created_time:
-                        comment_data["created_time"] = created_time
+                    created_time = row[created_time_idx].strip() or None
                         
-                comments_meta.append(comment_data)
+                comments.append(comment_id, comment_text, created_time)
         else:
             # Fallback to assuming first column is text (old behavior)
             for i, row in enumerate(rows, 1):
@@ -149,36 +343,18 @@ async def analyze_csv(
                     continue
                 comment_text = row[0].strip()  # Take first column as comment text
                 if comment_text:  # Skip empty comments
-                    comments_meta.append({
-                        "comment_id": f"csv_{i}",  # Generate synthetic IDs
-                        "text": comment_text
-                    })
-        if not comments_meta:
-            return {
-                "page_id": "csv_input",
-                "comments_analyzed": [],
-                "analytics": {
-                    "total_comments": 0,
-                    "positive_comments": 0,
-                    "negative_comments": 0,
-                    "neutral_comments": 0,
-                    "categories_stats": [],
-                },
-            }
+                    comments.append(f"csv_{i}", comment_text)  # Generate synthetic IDs
+        if not len(comments):
+            return "csv_input", CommentBatch(), None
 
         # Run analysis using existing pipeline
         try:
-            merged, analytics = analyze_comments(MODELS, comments_meta, batch_size=batch_size)
+            merged, analytics = await _run_analysis(comments, batch_size=batch_size)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Model inference error: {e}")
 
         # Format response
-        results = [CommentResult(**m) for m in merged]
-        return {
-            "page_id": "csv_input", 
-            "comments_analyzed": results,
-            "analytics": analytics
-        }
+        return "csv_input", merged, analytics
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing CSV: {str(e)}")
@@ -186,35 +362,34 @@ async def analyze_csv(
 
 @app.post("/analyze-csv-upload", response_model=AnalyzeResponse)
 async def analyze_csv_upload(
+    request: Request,
     file: UploadFile = File(...),
-    batch_size: int = Form(32),
+    batch_size: Optional[int] = Form(None),
 ):
     """Accept a CSV file upload and analyze its comments.
 
     Supported CSV formats:
     - With header (preferred): columns "id", "comment"; optional "created_time" (ISO or parseable string)
     - Without header: first column treated as the comment text
+
+    `batch_size` defaults to the tuned batch size and is clamped to the tuned range.
     """
+    content_bytes = await file.read()
+    batch_size = autotune.clamp_batch_size(batch_size, TUNING)
+    key = make_key("analyze-csv-upload", content_hash(content_bytes), batch_size)
+    cost = ADMISSION.estimate_csv(content_bytes)
+    return await _cached_json(key, lambda: _analyze_csv_upload(content_bytes, batch_size), _client_id(request), cost)
+
+async def _analyze_csv_upload(content_bytes: bytes, batch_size: int):
     try:
-        content_bytes = await file.read()
         text = content_bytes.decode("utf-8", errors="ignore")
 
         # Use csv module to read; detect header by checking the first line
-        comments_meta = []
+        comments = CommentBatch()
         reader = csv.reader(text.splitlines())
         rows = list(reader)
         if not rows:
-            return {
-                "page_id": "csv_input",
-                "comments_analyzed": [],
-                "analytics": {
-                    "total_comments": 0,
-                    "positive_comments": 0,
-                    "negative_comments": 0,
-                    "neutral_comments": 0,
-                    "categories_stats": [],
-                },
-            }
+            return "csv_input", CommentBatch(), None
 
         header = [c.strip().lower() for c in rows[0]] if rows else []
         has_header = "comment" in header or "id" in header
@@ -238,11 +413,7 @@ async def analyze_csv_upload(
                 if "created_time" in col_idx and col_idx["created_time"] < len(row):
                     created_time_val = str(row[col_idx["created_time"]]).strip()
                     created_time = created_time_val or None
-                comments_meta.append({
-                    "comment_id": comment_id,
-                    "text": comment_text,
-                    "created_time": created_time,
-                })
+                comments.append(comment_id, comment_text, created_time)
         else:
             # No header: first column is comment text
             for i, row in enumerate(rows, start=1):
@@ -250,38 +421,129 @@ async def analyze_csv_upload(
                     continue
                 comment_text = (row[0] or "").strip()
                 if comment_text:
-                    comments_meta.append({
-                        "comment_id": f"csv_{i}",
-                        "text": comment_text,
-                    })
-
-        if not comments_meta:
-            return {
-                "page_id": "csv_input",
-                "comments_analyzed": [],
-                "analytics": {
-                    "total_comments": 0,
-                    "positive_comments": 0,
-                    "negative_comments": 0,
-                    "neutral_comments": 0,
-                    "categories_stats": [],
-                },
-            }
+                    comments.append(f"csv_{i}", comment_text)
+
+        if not len(comments):
+            return "csv_input", CommentBatch(), None
 
         try:
-            merged, analytics = analyze_comments(MODELS, comments_meta, batch_size=batch_size)
+            merged, analytics = await _run_analysis(comments, batch_size=batch_size)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Model inference error: {e}")
 
-        results = [CommentResult(**m) for m in merged]
-        return {
-            "page_id": "csv_input",
-            "comments_analyzed": results,
-            "analytics": analytics,
-        }
+        return "csv_input", merged, analytics
 
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing upload: {str(e)}")
 
+
+@app.post("/monitor/pages", response_model=list[MonitorPageStatus])
+async def monitor_add_pages(req: MonitorPagesRequest, replace: bool = False):
+    """Add (or update) pages to the monitoring schedule.
+
+    `replace=true` drops the pages not listed that are monitored with the same tokens.
+    """
+    SCHEDULER.set_pages(req.pages, replace=replace)
+    return SCHEDULER.status()
+
+@app.get("/monitor/pages", response_model=list[MonitorPageStatus])
+async def monitor_list_pages():
+    return SCHEDULER.status()
+
+def _check_page_token(page: str, token: str) -> None:
+    # results were scraped with the page's token: only its holder may read or remove them
+    # (same 404 for unknown pages and other tokens, so monitored pages cannot be probed)
+    if not SCHEDULER.owned_by(page, token):
+        raise HTTPException(status_code=404, detail=f"Page not monitored: {page}")
+
+@app.delete("/monitor/pages/{page}")
+async def monitor_remove_page(page: str, graph_api_key: str = Header(..., alias="X-Graph-Api-Key")):
+    _check_page_token(page, graph_api_key)
+    SCHEDULER.remove_page(page)
+    return {"ok": True}
+
+@app.get("/monitor/results/{page}", response_model=AnalyzeResponse)
+async def monitor_result(page: str, graph_api_key: str = Header(..., alias="X-Graph-Api-Key")):
+    """Latest result for a monitored page; send the page's access token in `X-Graph-Api-Key`."""
+    _check_page_token(page, graph_api_key)
+    entry = RESULT_STORE.get(normalize_page(page))
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"No results yet for page: {page}")
+    return Response(content=entry["result"], media_type="application/json")
+
+
+def _get_analysis(analysis_id: str):
+    entry = ANALYSES.get(analysis_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Analysis not found or expired: {analysis_id}")
+    return entry
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip (`gzip;q=0` refuses it; an explicit gzip overrides `*`)."""
+    qualities = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding.strip().lower()] = q
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+def _stream_csv(request: Request, chunks, filename: str) -> StreamingResponse:
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"', "Vary": "Accept-Encoding"}
+    if _accepts_gzip(request.headers.get("accept-encoding", "")):
+        headers["Content-Encoding"] = "gzip"
+        body = gzip_stream(chunks)
+    else:
+        body = encode_stream(chunks)
+    return StreamingResponse(body, media_type="text/csv; charset=utf-8", headers=headers)
+
+@app.get("/analyses/{analysis_id}/comments.csv")
+async def export_comments_csv(analysis_id: str, request: Request):
+    """Stream the analyzed comments as CSV (gzip on the fly when the client accepts it)."""
+    _, comments, _ = _get_analysis(analysis_id)
+    return _stream_csv(request, iter_comments_csv(comments), f"comments-{analysis_id[:12]}.csv")
+
+@app.get("/analyses/{analysis_id}/categories.csv")
+async def export_categories_csv(analysis_id: str, request: Request):
+    _, _, analytics = _get_analysis(analysis_id)
+    return _stream_csv(request, iter_categories_csv(analytics), f"categories-{analysis_id[:12]}.csv")
+
+@app.get("/analyses/{analysis_id}/comments.xlsx")
+async def export_comments_xlsx(analysis_id: str):
+    _, comments, _ = _get_analysis(analysis_id)
+    # xlsx is a zip archive and cannot be streamed while written; spool to disk past 8 MB
+    out = tempfile.SpooledTemporaryFile(max_size=8 * 2**20)
+    try:
+        await run_in_threadpool(write_xlsx, comments, out)
+    except RuntimeError as e:
+        out.close()
+        raise HTTPException(status_code=501, detail=str(e))
+    out.seek(0)
+
+    def _chunks():
+        with out:
+            while True:
+                data = out.read(64 * 1024)
+                if not data:
+                    break
+                yield data
+
+    return StreamingResponse(
+        _chunks(),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f'attachment; filename="comments-{analysis_id[:12]}.xlsx"'},
+    )
+
+@app.get("/analyses/{analysis_id}/report")
+async def export_report(analysis_id: str):
+    """Pre-aggregated report data, so the client does not need the full comment list."""
+    page_id, comments, analytics = _get_analysis(analysis_id)
+    return await run_in_threadpool(build_report, page_id, comments, analytics)
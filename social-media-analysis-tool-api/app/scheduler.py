@@ -0,0 +1,248 @@
+# app/scheduler.py
+import asyncio
+import hmac
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional
+
+from app.cache import token_digest
+from app.fb_scraper import normalize_page
+from app.schemas import MonitorPage
+from app.store import ResultStore
+
+log = logging.getLogger(__name__)
+
+
+def _token_key(token: str) -> str:
+    # never keep raw tokens as dict keys / in status output
+    return token_digest(token)[:16]
+
+
+class _PageJob:
+    __slots__ = ("key", "spec", "token_key", "state", "last_error", "not_before")
+
+    def __init__(self, key: str, spec: MonitorPage, not_before: float = 0.0):
+        self.key = key
+        self.spec = spec
+        self.token_key = _token_key(spec.graph_api_key)
+        self.state = "idle"  # idle | queued | running
+        self.last_error: Optional[str] = None
+        self.not_before = not_before  # first-run jitter, or set after a failure to defer the retry
+
+
+def _spec_dict(spec: MonitorPage) -> Dict[str, Any]:
+    return spec.model_dump() if hasattr(spec, "model_dump") else spec.dict()
+
+
+class PageScheduler:
+    """Periodically refreshes many monitored pages.
+
+    - at most `max_concurrency` pages are scraped/analyzed at once (global budget)
+    - at most `max_per_token` of those share one access token
+    - due pages are queued per token and dispatched round-robin across tokens, so
+      one token with hundreds of pages cannot starve the others
+    - a page is only due once `interval_seconds` have passed since its last
+      refresh in the store; failed pages are deferred by `retry_seconds`
+    - pages and refresh times are persisted in the store, so a restart resumes
+      the schedule; pages never refreshed are first due at a random time
+      within `first_run_jitter` seconds, so a bulk registration (or restart)
+      does not refresh hundreds of pages at once
+    - a page's result was scraped with its token: only that token may read or
+      remove it, and it is dropped when the page is removed or changes token
+    """
+
+    def __init__(self, run_page: Callable[[MonitorPage], Awaitable[bytes]], store: ResultStore,
+                 max_concurrency: int = 8, max_per_token: int = 2,
+                 tick_seconds: float = 5.0, retry_seconds: float = 300.0, first_run_jitter: float = 300.0):
+        self.run_page = run_page
+        self.store = store
+        self.max_concurrency = max_concurrency
+        self.max_per_token = max_per_token
+        self.tick_seconds = tick_seconds
+        self.retry_seconds = retry_seconds
+        self.first_run_jitter = first_run_jitter
+
+        self._jobs: Dict[str, _PageJob] = {}
+        self._queues: Dict[str, Deque[_PageJob]] = {}
+        self._token_order: Deque[str] = deque()
+        self._active_per_token: Dict[str, int] = {}
+        self._active = 0
+        self._tasks: set = set()
+        self._wake = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+
+        now = time.time()
+        for key, spec in store.load_pages():
+            self._add(key, MonitorPage(**spec), now)
+
+    # --- page management ---
+    def _add(self, key: str, spec: MonitorPage, now: float) -> None:
+        not_before = 0.0
+        if self.store.last_refreshed(key) is None:
+            not_before = now + random.uniform(0, min(self.first_run_jitter, spec.interval_seconds))
+        self._jobs[key] = _PageJob(key, spec, not_before)
+
+    def set_pages(self, pages: Iterable[MonitorPage], replace: bool = False) -> List[str]:
+        """Add or update pages. `replace` drops the other pages monitored with the same tokens."""
+        keys = []
+        tokens = set()
+        now = time.time()
+        for spec in pages:
+            key = normalize_page(spec.page)
+            self.store.save_page(key, _spec_dict(spec))
+            job = self._jobs.get(key)
+            if job is None:
+                self._add(key, spec, now)
+            else:
+                if _token_key(job.spec.graph_api_key) != _token_key(spec.graph_api_key):
+                    # the stored result was scraped with the previous token
+                    self.store.delete(key)
+                # keep state; a queued job picks up the new spec when it runs
+                job.spec = spec
+                if job.state == "idle":
+                    job.token_key = _token_key(spec.graph_api_key)
+            keys.append(key)
+            tokens.add(_token_key(spec.graph_api_key))
+        if replace:
+            for key in set(self._jobs) - set(keys):
+                if _token_key(self._jobs[key].spec.graph_api_key) in tokens:
+                    self.remove_page(key)
+        self._wake.set()
+        return keys
+
+    def owned_by(self, page: str, token: str) -> bool:
+        """Whether `page` is monitored with `token`."""
+        job = self._jobs.get(normalize_page(page))
+        return job is not None and hmac.compare_digest(_token_key(job.spec.graph_api_key), _token_key(token))
+
+    def remove_page(self, page: str) -> bool:
+        job = self._jobs.pop(normalize_page(page), None)
+        if job is None:
+            return False
+        self.store.delete_page(job.key)
+        self.store.delete(job.key)
+        queue = self._queues.get(job.token_key)
+        if queue is not None and job in queue:
+            queue.remove(job)
+        return True
+
+    def status(self) -> List[Dict[str, Any]]:
+        out = []
+        for job in self._jobs.values():
+            last = self.store.last_refreshed(job.key)
+            next_due = None
+            if last is not None or job.not_before:
+                next_due = max(job.not_before, (last or 0.0) + job.spec.interval_seconds)
+            out.append({
+                "page": job.key,
+                "interval_seconds": job.spec.interval_seconds,
+                "state": job.state,
+                "last_refreshed": last,
+                "last_error": job.last_error,
+                "next_due": next_due,
+            })
+        return out
+
+    # --- lifecycle ---
+    async def start(self) -> None:
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        for t in list(self._tasks):
+            t.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _loop(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                self._enqueue_due(time.time())
+                self._dispatch()
+            except Exception as e:
+                log.exception(f"scheduler tick failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.tick_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    # --- queueing ---
+    def _is_due(self, job: _PageJob, now: float) -> bool:
+        if now < job.not_before:
+            return False
+        last = self.store.last_refreshed(job.key)
+        return last is None or now - last >= job.spec.interval_seconds
+
+    def _enqueue_due(self, now: float) -> None:
+        for job in self._jobs.values():
+            if job.state != "idle" or not self._is_due(job, now):
+                continue
+            job.state = "queued"
+            queue = self._queues.setdefault(job.token_key, deque())
+            queue.append(job)
+            if job.token_key not in self._token_order:
+                self._token_order.append(job.token_key)
+
+    def _dispatch(self) -> None:
+        while self._active < self.max_concurrency and self._token_order:
+            started = False
+            # one pass round-robin over tokens; each eligible token gets one slot
+            for _ in range(len(self._token_order)):
+                if self._active >= self.max_concurrency:
+                    break
+                tk = self._token_order[0]
+                self._token_order.rotate(-1)
+                queue = self._queues.get(tk)
+                if not queue:
+                    self._token_order.remove(tk)
+                    self._queues.pop(tk, None)
+                    continue
+                if self._active_per_token.get(tk, 0) >= self.max_per_token:
+                    continue
+                self._start(queue.popleft())
+                started = True
+            if not started:
+                break
+
+    def _start(self, job: _PageJob) -> None:
+        job.state = "running"
+        self._active += 1
+        self._active_per_token[job.token_key] = self._active_per_token.get(job.token_key, 0) + 1
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: _PageJob) -> None:
+        token_key = job.token_key
+        spec = job.spec
+        try:
+            result = await self.run_page(spec)
+            # not if the page was removed, or re-registered with another token, meanwhile
+            if self._jobs.get(job.key) is job and job.spec.graph_api_key == spec.graph_api_key:
+                self.store.put(job.key, result)
+            job.last_error = None
+            job.not_before = 0.0
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning(f"monitor refresh failed for page {job.key}: {e}")
+            job.last_error = str(e)
+            job.not_before = time.time() + min(self.retry_seconds, job.spec.interval_seconds)
+        finally:
+            job.state = "idle"
+            job.token_key = _token_key(job.spec.graph_api_key)
+            self._active -= 1
+            self._active_per_token[token_key] -= 1
+            if not self._active_per_token[token_key]:
+                del self._active_per_token[token_key]
+            self._wake.set()
@@ -22,6 +22,8 @@ class ScrapeResponse(BaseModel):
     page_id: str
     posts_scanned: int
     total_fetched: int
+    graph_requests: Optional[int] = None
+    requests_per_comment: Optional[float] = None
     comments: List[CommentOut]
 
 class CommentResult(BaseModel):
@@ -49,9 +51,28 @@ class CommentsAnalytics(BaseModel):
 
 class AnalyzeResponse(BaseModel):
     page_id: str
+    analysis_id: Optional[str] = None  # use with /analyses/{analysis_id}/... exports
     comments_analyzed: List[CommentResult]
     analytics: CommentsAnalytics
 
 class AnalyzeCsvRequest(BaseModel):
     file_path: str = Field(..., description="Path to CSV file containing comments")
     batch_size: int = Field(32, gt=0, le=128, description="Batch size for model inference")
+
+class MonitorPage(BaseModel):
+    graph_api_key: str = Field(..., min_length=10)
+    page: str = Field(..., description="page id / username / full url")
+    interval_seconds: int = Field(3600, ge=60, description="Minimum time between refreshes of this page")
+    max_posts: int = Field(10, gt=0, le=500)
+    max_comments: int = Field(500, gt=0, le=50000)
+
+class MonitorPagesRequest(BaseModel):
+    pages: List[MonitorPage]
+
+class MonitorPageStatus(BaseModel):
+    page: str
+    interval_seconds: int
+    state: str  # idle | queued | running
+    last_refreshed: Optional[float] = None
+    last_error: Optional[str] = None
+    next_due: Optional[float] = None
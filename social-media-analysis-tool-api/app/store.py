@@ -0,0 +1,92 @@
+# app/store.py
+import json
+import sqlite3
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class ResultStore:
+    """Monitored pages and their latest analysis result, persisted in SQLite.
+
+    Page specs and refresh times survive restarts, so the schedule resumes where
+    it left off instead of refreshing every page at once. Result bodies are
+    stored zlib-compressed; only refresh times are kept in memory. Page specs
+    include access tokens: keep the database file private.
+    """
+
+    def __init__(self, path: str = ":memory:", compress_level: int = 6):
+        self.path = path
+        self.compress_level = compress_level
+        # only used from the event loop thread
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS pages (page TEXT PRIMARY KEY, spec TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results (page TEXT PRIMARY KEY, refreshed_at REAL NOT NULL, result BLOB NOT NULL)"
+        )
+        self._refreshed: Dict[str, float] = dict(self._conn.execute("SELECT page, refreshed_at FROM results"))
+
+    # --- monitored pages ---
+    def save_page(self, page: str, spec: Dict[str, Any]) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO pages (page, spec) VALUES (?, ?)", (page, json.dumps(spec)))
+
+    def delete_page(self, page: str) -> None:
+        self._conn.execute("DELETE FROM pages WHERE page = ?", (page,))
+
+    def load_pages(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return [(page, json.loads(spec)) for page, spec in self._conn.execute("SELECT page, spec FROM pages")]
+
+    # --- results ---
+    def put(self, page: str, result: bytes, refreshed_at: Optional[float] = None) -> None:
+        refreshed_at = refreshed_at if refreshed_at is not None else time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO results (page, refreshed_at, result) VALUES (?, ?, ?)",
+            (page, refreshed_at, zlib.compress(result, self.compress_level)),
+        )
+        self._refreshed[page] = refreshed_at
+
+    def get(self, page: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute("SELECT refreshed_at, result FROM results WHERE page = ?", (page,)).fetchone()
+        if row is None:
+            return None
+        return {"page": page, "refreshed_at": row[0], "result": zlib.decompress(row[1])}
+
+    def last_refreshed(self, page: str) -> Optional[float]:
+        return self._refreshed.get(page)
+
+    def pages(self) -> List[str]:
+        return list(self._refreshed)
+
+    def delete(self, page: str) -> None:
+        self._conn.execute("DELETE FROM results WHERE page = ?", (page,))
+        self._refreshed.pop(page, None)
+
+
+class AnalysisStore:
+    """Recently completed analyses (columnar), kept for server-side exports.
+
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted beyond `max_entries`.
+    """
+
+    def __init__(self, ttl: float = 3600.0, max_entries: int = 32):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any, Any, Dict[str, Any]]]" = OrderedDict()
+
+    def put(self, analysis_id: str, page_id: Optional[str], comments, analytics: Dict[str, Any]) -> None:
+        self._entries[analysis_id] = (time.monotonic() + self.ttl, page_id, comments, analytics)
+        self._entries.move_to_end(analysis_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, analysis_id: str) -> Optional[Tuple[Optional[str], Any, Dict[str, Any]]]:
+        entry = self._entries.get(analysis_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._entries.pop(analysis_id, None)
+            return None
+        self._entries.move_to_end(analysis_id)
+        return entry[1:]
@@ -1,10 +1,12 @@
 # app/utils.py
 from typing import List, Dict, Any
 import math
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from itertools import chain
 import numpy
 import torch
+from app.batch import CommentBatch
 
 def chunk_list(items: List, chunk_size: int):
     for i in range(0, len(items), chunk_size):
@@ -62,11 +64,18 @@ def generate_analytics(merged_comments):
     Generate analytics from merged comments including sentiment and category statistics.
     
     Args:
-        merged_comments: List of dicts with 'sentiment' and 'category' fields
+        merged_comments: CommentBatch with predictions, or list of dicts with 'sentiment' and 'category' fields
     
     Returns:
         Dict with total counts and per-category statistics
     """
+    if isinstance(merged_comments, CommentBatch):
+        sentiments = merged_comments.sentiment
+        categories = merged_comments.category
+    else:
+        sentiments = [c.get("sentiment") for c in merged_comments]
+        categories = [c.get("category") for c in merged_comments]
+
     analytics = {
         "total_comments": len(merged_comments),
         "positive_comments": 0,
@@ -75,80 +84,93 @@ def generate_analytics(merged_comments):
         "categories_stats": {}
     }
     
-    # Initialize category stats
-    categories = {c["category"] for c in merged_comments if c["category"]}
-    for cat in categories:
-        analytics["categories_stats"][cat] = {
-            "category": cat,
-            "total_comments": 0,
-            "positive_comments": 0,
-            "negative_comments": 0,
-            "neutral_comments": 0
-        }
-    
-    # Count statistics
-    for comment in merged_comments:
-        sentiment = comment.get("sentiment", "").lower()
-        category = comment.get("category")
-        
-        # Update global sentiment counts
+    # Count statistics; labels are interned so (sentiment, category) pairs are cheap to tally
+    for (sentiment, category), n in Counter(zip(sentiments, categories)).items():
+        sentiment = (sentiment or "").lower()
         if sentiment == "positive":
-            analytics["positive_comments"] += 1
+            key = "positive_comments"
         elif sentiment == "negative":
-            analytics["negative_comments"] += 1
+            key = "negative_comments"
         else:
-            analytics["neutral_comments"] += 1
-            
+            key = "neutral_comments"
+
+        # Update global sentiment counts
+        analytics[key] += n
+
         # Update per-category counts
         if category:
-            cat_stats = analytics["categories_stats"][category]
-            cat_stats["total_comments"] += 1
-            if sentiment == "positive":
-                cat_stats["positive_comments"] += 1
-            elif sentiment == "negative":
-                cat_stats["negative_comments"] += 1
-            else:
-                cat_stats["neutral_comments"] += 1
+            cat_stats = analytics["categories_stats"].get(category)
+            if cat_stats is None:
+                cat_stats = analytics["categories_stats"][category] = {
+                    "category": category,
+                    "total_comments": 0,
+                    "positive_comments": 0,
+                    "negative_comments": 0,
+                    "neutral_comments": 0
+                }
+            cat_stats["total_comments"] += n
+            cat_stats[key] += n
     
     # Convert categories_stats from dict to list for better API response
     analytics["categories_stats"] = list(analytics["categories_stats"].values())
     return analytics
 
-def analyze_comments(models, comments_meta, batch_size=32):
+def predict_batch(models, batch_texts, concurrent=True):
     """
-    comments_meta: ordered list of dicts each has 'comment_id' and 'text'
-    models: instance from models.get_models()
-    returns merged predictions (list) and analytics
+    Run both pipelines on one batch of texts, in parallel via ThreadPoolExecutor
+    (concurrent=True) or one after the other.
+    returns (sentiment_preds, topic_preds), each a list aligned with batch_texts
     """
-    texts = [c["text"] for c in comments_meta]
-    # We'll collect predictions in the original order
-    sentiment_results = []
-    topic_results = []
-
-    # Execute batches; for each batch run both pipelines in parallel via ThreadPoolExecutor
-    for batch_texts in chunk_list(texts, batch_size):
+    print('Analyzing batch of size:', len(batch_texts))
+    if concurrent:
         with ThreadPoolExecutor(max_workers=2) as ex:
-            print('Analyzing batch of size:', len(batch_texts))
             fut_s = ex.submit(_predict_batch, models.sentiment_pipe, batch_texts)
             fut_t = ex.submit(_predict_batch, models.topics_pipe, batch_texts)
             print('Waiting for model predictions...')
             s_out = fut_s.result()
             t_out = fut_t.result()
-            print('Batch analysis done.')
+    else:
+        s_out = _predict_batch(models.sentiment_pipe, batch_texts)
+        t_out = _predict_batch(models.topics_pipe, batch_texts)
+    print('Batch analysis done.')
 
-        # pipeline returns a list of dicts corresponding to batch_texts (or single dict for single input)
-        # normalize to list form
-        if isinstance(s_out, dict):
-            s_out = [s_out]
-        if isinstance(t_out, dict):
-            t_out = [t_out]
+    # pipeline returns a list of dicts corresponding to batch_texts (or single dict for single input)
+    # normalize to list form
+    if isinstance(s_out, dict):
+        s_out = [s_out]
+    if isinstance(t_out, dict):
+        t_out = [t_out]
+    return s_out, t_out
+
+def predict_texts(models, texts, batch_size=32, concurrent=True):
+    """
+    predict_batch over `texts` in chunks of `batch_size`, in order.
+    returns (sentiment_preds, topic_preds), each a list aligned with texts
+    """
+    sentiment_results = []
+    topic_results = []
+    for batch_texts in chunk_list(texts, batch_size):
+        s_out, t_out = predict_batch(models, batch_texts, concurrent=concurrent)
         sentiment_results.extend(s_out)
         topic_results.extend(t_out)
+    return sentiment_results, topic_results
+
+def analyze_comments(models, comments, batch_size=32, concurrent=True):
+    """
+    comments: CommentBatch (or ordered list of dicts each with 'comment_id' and 'text')
+    models: instance from models.get_models()
+    concurrent: run the two pipelines in parallel per batch (see app.autotune)
+    returns the CommentBatch with predictions filled in, and analytics
+    """
+    if not isinstance(comments, CommentBatch):
+        comments = CommentBatch.from_dicts(comments)
+    # Execute batches in the original order; for each batch run both pipelines
+    sentiment_results, topic_results = predict_texts(models, comments.text, batch_size, concurrent)
 
     # merge (works because we processed in-order batches)
-    merged = merge_model_outputs(comments_meta, sentiment_results, topic_results)
+    comments.set_predictions(sentiment_results, topic_results)
     
     # Generate analytics from merged results
-    analytics = generate_analytics(merged)
+    analytics = generate_analytics(comments)
     
-    return merged, analytics
+    return comments, analytics
@@ -0,0 +1,96 @@
+# app/worker.py
+"""Stateless inference worker for work-queue mode.
+
+Run on any node that can reach the queue:
+
+    python -m app.worker --queue sqlite:///queue.db
+    python -m app.worker --queue redis://queue-host:6379/0
+
+and start the API with WORK_QUEUE_URL set to the same queue. Each claimed task
+is predicted in batches of this worker's tuned size (python -m app.autotune on
+the worker host), whatever size the API chose for the task.
+"""
+import argparse
+import logging
+import os
+import time
+
+from app import autotune
+from app.models import get_models
+from app.utils import predict_texts
+from app.workqueue import make_queue
+
+log = logging.getLogger("app.worker")
+
+
+def run_worker(queue_url: str, sentiment_dir: str, topics_dir: str, device: int = -1,
+               poll_interval: float = 0.5, max_tasks: int = 0):
+    queue = make_queue(queue_url)
+    tuning = dict(autotune.DEFAULT_CONFIG)
+    tuning.update(autotune.load_config(device) or {})
+    autotune.apply_threads(tuning)
+    models = get_models(sentiment_dir=sentiment_dir, topics_dir=topics_dir, device=device)
+    log.info(f"Worker ready (batch_size={tuning['batch_size']}), polling {queue_url}")
+
+    process_tasks(queue, models, tuning, poll_interval, max_tasks)
+
+
+def process_tasks(queue, models, tuning, poll_interval: float = 0.5, max_tasks: int = 0,
+                  max_backoff: float = 30.0) -> int:
+    """Claim, predict and report tasks until `max_tasks` are processed (0 = forever).
+
+    Queue errors (e.g. the Redis connection dropping) are logged and retried with
+    exponential backoff; a batch whose outcome could not be reported is redone
+    once its lease expires.
+    """
+    processed = 0
+    backoff = poll_interval
+    while not max_tasks or processed < max_tasks:
+        try:
+            task = queue.claim()
+        except Exception as e:
+            log.warning(f"claiming a batch failed: {e}; retrying in {backoff:.1f}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, max_backoff)
+            continue
+        if task is None:
+            backoff = poll_interval
+            time.sleep(poll_interval)
+            continue
+        try:
+            s_out, t_out = predict_texts(models, task.texts, tuning["batch_size"], tuning["concurrent"])
+        except Exception as e:
+            log.exception(f"batch {task.task_id} failed: {e}")
+            report, args = queue.fail, (task, str(e))
+        else:
+            report, args = queue.complete, (task, s_out, t_out)
+        try:
+            report(*args)
+        except Exception as e:
+            log.warning(f"reporting batch {task.task_id} failed: {e}; retrying in {backoff:.1f}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, max_backoff)
+        else:
+            backoff = poll_interval
+        processed += 1
+    return processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inference worker for the analysis work queue")
+    parser.add_argument("--queue", default=os.getenv("WORK_QUEUE_URL"), help="sqlite:///path.db or redis://host:port/db")
+    parser.add_argument("--sentiment-dir", default="models/sentiment")
+    parser.add_argument("--topics-dir", default="models/topics")
+    parser.add_argument("--device", type=int, default=-1, help="-1 for CPU, or GPU id")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--max-tasks", type=int, default=0, help="exit after N batches (0 = run forever)")
+    args = parser.parse_args()
+    if not args.queue:
+        parser.error("--queue or WORK_QUEUE_URL is required")
+
+    logging.basicConfig(level=logging.INFO)
+    run_worker(args.queue, args.sentiment_dir, args.topics_dir, args.device, args.poll_interval, args.max_tasks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+# app/workqueue.py
+import asyncio
+import json
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.batch import CommentBatch
+from app.utils import chunk_list, generate_analytics
+
+
+class WorkQueueError(Exception):
+    """Raised when a distributed inference job fails or times out."""
+
+
+class Task:
+    __slots__ = ("task_id", "job_id", "seq", "texts")
+
+    def __init__(self, task_id: str, job_id: str, seq: int, texts: List[str]):
+        self.task_id = task_id
+        self.job_id = job_id
+        self.seq = seq
+        self.texts = texts
+
+
+class WorkQueue(ABC):
+    """Durable queue of inference batches shared by the API and inference workers.
+
+    The API `submit`s a job (an ordered list of text batches), polls `progress`
+    and reads `results` once every batch is done; workers `claim` one batch at
+    a time and `complete` it with the model outputs. A claimed batch that is
+    not completed within `lease_seconds` (worker died) becomes claimable again.
+    """
+
+    lease_seconds: float = 300.0
+
+    @abstractmethod
+    def submit(self, batches: List[List[str]]) -> str:
+        ...
+
+    @abstractmethod
+    def claim(self) -> Optional[Task]:
+        ...
+
+    @abstractmethod
+    def complete(self, task: Task, sentiment_preds: List[Any], topic_preds: List[Any]) -> None:
+        ...
+
+    @abstractmethod
+    def fail(self, task: Task, error: str) -> None:
+        ...
+
+    @abstractmethod
+    def progress(self, job_id: str) -> Dict[str, Any]:
+        """Returns {total, done, error}: counts only, cheap enough to poll."""
+
+    @abstractmethod
+    def results(self, job_id: str) -> Dict[int, Tuple[List[Any], List[Any]]]:
+        """Returns {seq: (sentiment_preds, topic_preds)} for the completed batches."""
+
+    @abstractmethod
+    def delete(self, job_id: str) -> None:
+        """Drops the job: its results, and any of its batches not yet claimed."""
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """WorkQueue on a single SQLite file; enough for one host / tests.
+
+    Like the Redis keys, jobs expire `job_ttl` seconds after submission: if the
+    API died mid-job, its batches are dropped at claim time instead of being run,
+    and its result rows are deleted.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300.0, job_ttl: float = 3600.0):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.job_ttl = job_ttl
+        self._local = threading.local()
+        with self._tx() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS tasks (
+                    task_id TEXT PRIMARY KEY,
+                    job_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    claimed_at REAL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL DEFAULT 0
+                )"""
+            )
+            if "created_at" not in [row[1] for row in conn.execute("PRAGMA table_info(tasks)")]:
+                # queue files from before job expiry: their leftover tasks count as expired
+                conn.execute("ALTER TABLE tasks ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_job_status ON tasks(job_id, status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks(status, claimed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_created ON tasks(created_at)")
+
+    def _tx(self) -> "_Tx":
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return _Tx(conn)
+
+    def submit(self, batches: List[List[str]]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._tx() as conn:
+            conn.executemany(
+                "INSERT INTO tasks (task_id, job_id, seq, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(f"{job_id}:{i}", job_id, i, json.dumps(texts), now) for i, texts in enumerate(batches)],
+            )
+        return job_id
+
+    def claim(self) -> Optional[Task]:
+        now = time.time()
+        with self._tx() as conn:
+            conn.execute("DELETE FROM tasks WHERE created_at < ?", (now - self.job_ttl,))
+            row = conn.execute(
+                """SELECT task_id, job_id, seq, payload FROM tasks
+                   WHERE status = 'pending' OR (status = 'claimed' AND claimed_at < ?)
+                   ORDER BY rowid LIMIT 1""",
+                (now - self.lease_seconds,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE tasks SET status = 'claimed', claimed_at = ? WHERE task_id = ?", (now, row[0]))
+        return Task(row[0], row[1], row[2], json.loads(row[3]))
+
+    def complete(self, task: Task, sentiment_preds: List[Any], topic_preds: List[Any]) -> None:
+        with self._tx() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = 'done', result = ? WHERE task_id = ?",
+                (json.dumps([sentiment_preds, topic_preds]), task.task_id),
+            )
+
+    def fail(self, task: Task, error: str) -> None:
+        with self._tx() as conn:
+            conn.execute("UPDATE tasks SET status = 'failed', error = ? WHERE task_id = ?", (error, task.task_id))
+
+    def progress(self, job_id: str) -> Dict[str, Any]:
+        with self._tx() as conn:
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM tasks WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+            error = None
+            if counts.get("failed"):
+                error = conn.execute(
+                    "SELECT error FROM tasks WHERE job_id = ? AND status = 'failed' LIMIT 1", (job_id,)
+                ).fetchone()[0]
+        return {"total": sum(counts.values()), "done": counts.get("done", 0), "error": error}
+
+    def results(self, job_id: str) -> Dict[int, Tuple[List[Any], List[Any]]]:
+        with self._tx() as conn:
+            rows = conn.execute("SELECT seq, result FROM tasks WHERE job_id = ? AND status = 'done'", (job_id,)).fetchall()
+        return {seq: tuple(json.loads(result)) for seq, result in rows}
+
+    def delete(self, job_id: str) -> None:
+        with self._tx() as conn:
+            conn.execute("DELETE FROM tasks WHERE job_id = ?", (job_id,))
+
+
+class _Tx:
+    """`with` wrapper running a block in one IMMEDIATE transaction (serializes claims)."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+# Claim and requeue in one step: expired leases go back to the front of the queue,
+# tasks of deleted/expired jobs are dropped instead of being run.
+# (Touches the job's task hash, which is not in KEYS: single Redis node only, not Cluster.)
+_CLAIM_LUA = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, id in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], id)
+    redis.call('RPUSH', KEYS[1], id)
+end
+while true do
+    local id = redis.call('RPOP', KEYS[1])
+    if not id then
+        return false
+    end
+    local job, seq = string.match(id, '^(%x+):(%d+)$')
+    local texts = job and redis.call('HGET', ARGV[3] .. ':job:' .. job .. ':tasks', seq)
+    if texts then
+        redis.call('ZADD', KEYS[2], tonumber(ARGV[1]) + tonumber(ARGV[2]), id)
+        return {id, texts}
+    end
+end
+"""
+
+# Store a batch's outcome only while its job exists, expiring with the job; always drop the lease.
+_FINISH_LUA = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+local ttl = redis.call('PTTL', KEYS[2])
+if ttl == -2 then
+    return 0
+end
+redis.call('HDEL', KEYS[3], ARGV[2])
+if ARGV[4] == 'done' then
+    redis.call('HSET', KEYS[4], ARGV[2], ARGV[3])
+else
+    redis.call('SET', KEYS[4], ARGV[3])
+end
+if ttl > 0 then
+    redis.call('PEXPIRE', KEYS[4], ttl)
+end
+return 1
+"""
+
+
+class RedisWorkQueue(WorkQueue):
+    """WorkQueue on any Redis-compatible server (requires the `redis` package).
+
+    Keys (under `prefix`): `pending` (list of task ids), `claimed` (zset of task
+    id -> lease deadline) and per job `job:<id>:{total,tasks,done,error}`, which
+    expire after `job_ttl` seconds so abandoned jobs do not pile up.
+    """
+
+    def __init__(self, url: str, prefix: str = "smat", lease_seconds: float = 300.0, job_ttl: float = 3600.0):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RedisWorkQueue requires the `redis` package (pip install redis)") from e
+        self.r = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.lease_seconds = lease_seconds
+        self.job_ttl = job_ttl
+        self._claim = self.r.register_script(_CLAIM_LUA)
+        self._finish = self.r.register_script(_FINISH_LUA)
+
+    def _k(self, *parts: str) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    def submit(self, batches: List[List[str]]) -> str:
+        job_id = uuid.uuid4().hex
+        ttl = int(self.job_ttl)
+        pipe = self.r.pipeline()
+        pipe.set(self._k("job", job_id, "total"), len(batches), ex=ttl)
+        if batches:
+            pipe.hset(self._k("job", job_id, "tasks"), mapping={i: json.dumps(texts) for i, texts in enumerate(batches)})
+            pipe.expire(self._k("job", job_id, "tasks"), ttl)
+            pipe.lpush(self._k("pending"), *(f"{job_id}:{i}" for i in range(len(batches))))
+        pipe.execute()
+        return job_id
+
+    def claim(self) -> Optional[Task]:
+        item = self._claim(keys=[self._k("pending"), self._k("claimed")],
+                           args=[time.time(), self.lease_seconds, self.prefix])
+        if item is None:
+            return None
+        task_id, texts = item[0].decode("utf-8"), item[1]
+        job_id, seq = task_id.rsplit(":", 1)
+        return Task(task_id, job_id, int(seq), json.loads(texts))
+
+    def _finish_task(self, task: Task, key: str, value: str, kind: str) -> None:
+        self._finish(
+            keys=[self._k("claimed"), self._k("job", task.job_id, "total"), self._k("job", task.job_id, "tasks"), key],
+            args=[task.task_id, task.seq, value, kind],
+        )
+
+    def complete(self, task: Task, sentiment_preds: List[Any], topic_preds: List[Any]) -> None:
+        self._finish_task(task, self._k("job", task.job_id, "done"), json.dumps([sentiment_preds, topic_preds]), "done")
+
+    def fail(self, task: Task, error: str) -> None:
+        self._finish_task(task, self._k("job", task.job_id, "error"), error, "error")
+
+    def progress(self, job_id: str) -> Dict[str, Any]:
+        pipe = self.r.pipeline()
+        pipe.get(self._k("job", job_id, "total"))
+        pipe.hlen(self._k("job", job_id, "done"))
+        pipe.get(self._k("job", job_id, "error"))
+        total, done, error = pipe.execute()
+        return {
+            "total": int(total or 0),
+            "done": int(done),
+            "error": error.decode("utf-8") if error else None,
+        }
+
+    def results(self, job_id: str) -> Dict[int, Tuple[List[Any], List[Any]]]:
+        return {int(seq): tuple(json.loads(v)) for seq, v in self.r.hgetall(self._k("job", job_id, "done")).items()}
+
+    def delete(self, job_id: str) -> None:
+        # without its task payloads, the job's pending batches are dropped at claim time
+        self.r.delete(*(self._k("job", job_id, part) for part in ("total", "tasks", "done", "error")))
+
+
+def make_queue(url: str) -> WorkQueue:
+    """Build a queue from a URL: `sqlite:///path/to/queue.db` or `redis://host:6379/0`."""
+    scheme = urlparse(url).scheme
+    if scheme == "sqlite":
+        return SQLiteWorkQueue(url[len("sqlite:///"):] if url.startswith("sqlite:///") else url[len("sqlite://"):])
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisWorkQueue(url)
+    raise ValueError(f"Unsupported work queue url: {url}")
+
+
+async def analyze_comments_queued(queue: WorkQueue, comments, batch_size=32,
+                                  timeout: float = 600.0, poll_interval: float = 0.25):
+    """
+    Same contract as utils.analyze_comments, but batches are put on `queue` and
+    predicted by inference workers (`python -m app.worker`) instead of in-process.
+    `batch_size` is the number of comments per queued task; workers predict each
+    task in batches of their own tuned size.
+    returns the CommentBatch with predictions filled in, and analytics
+    """
+    if not isinstance(comments, CommentBatch):
+        comments = CommentBatch.from_dicts(comments)
+    batches = list(chunk_list(comments.text, batch_size))
+    job_id = await asyncio.to_thread(queue.submit, batches)
+    deadline = time.monotonic() + timeout
+    try:
+        # poll counts only; the results are read once, when every batch is done
+        while True:
+            state = await asyncio.to_thread(queue.progress, job_id)
+            if state["error"]:
+                raise WorkQueueError(f"Inference worker error: {state['error']}")
+            if state["done"] >= len(batches):
+                break
+            if time.monotonic() > deadline:
+                raise WorkQueueError(f"Timed out waiting for {len(batches) - state['done']} of {len(batches)} batches")
+            await asyncio.sleep(poll_interval)
+        done = await asyncio.to_thread(queue.results, job_id)
+    finally:
+        await asyncio.to_thread(queue.delete, job_id)
+
+    sentiment_results = []
+    topic_results = []
+    for seq in range(len(batches)):
+        s_out, t_out = done[seq]
+        sentiment_results.extend(s_out)
+        topic_results.extend(t_out)
+
+    comments.set_predictions(sentiment_results, topic_results)
+    analytics = generate_analytics(comments)
+    return comments, analytics
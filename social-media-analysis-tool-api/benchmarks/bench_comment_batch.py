@@ -0,0 +1,103 @@
+# benchmarks/bench_comment_batch.py
+"""Memory / time of the dict-per-comment path vs. CommentBatch, without the models.
+
+    python -m benchmarks.bench_comment_batch --n 50000
+
+Model outputs are synthesized so only the scraper -> merge -> analytics -> JSON
+plumbing is measured.
+"""
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from app.batch import CommentBatch
+from app.utils import merge_model_outputs, generate_analytics
+
+try:
+    from app.schemas import CommentResult
+    from fastapi.encoders import jsonable_encoder
+except ImportError:  # plumbing-only run without pydantic / fastapi
+    CommentResult = None
+
+SENTIMENTS = ["positive", "negative", "neutral"]
+CATEGORIES = ["service", "price", "quality", "delivery", "other"]
+
+
+def make_raw(n):
+    rnd = random.Random(0)
+    raw = [
+        {
+            "id": f"{i // 100}_{i}",
+            "message": f"comment number {i} " + "lorem ipsum " * rnd.randint(1, 10),
+            "from": {"id": str(rnd.randint(1, 10**9)), "name": f"user {i % 977}"},
+            "created_time": "2025-09-06T12:00:00+0000",
+        }
+        for i in range(n)
+    ]
+    s_preds = [{"label": rnd.choice(SENTIMENTS), "score": rnd.random()} for _ in range(n)]
+    t_preds = [{"label": rnd.choice(CATEGORIES), "score": rnd.random()} for _ in range(n)]
+    return raw, s_preds, t_preds
+
+
+def dict_path(raw, s_preds, t_preds):
+    # fetch_all_comments._fetch_for_post
+    comments = [{
+        "comment_id": c.get("id"),
+        "post_id": c["id"].split("_")[0],
+        "text": c.get("message"),
+        "author_id": (c.get("from") or {}).get("id"),
+        "author_name": (c.get("from") or {}).get("name"),
+        "created_time": c.get("created_time"),
+    } for c in raw]
+    # main.py comments_meta
+    comments_meta = [{"comment_id": c.get("comment_id"), "text": c.get("text", ""), "created_time": c.get("created_time")} for c in comments]
+    merged = merge_model_outputs(comments_meta, s_preds, t_preds)
+    analytics = generate_analytics(merged)
+    if CommentResult is not None:
+        results = jsonable_encoder([CommentResult(**m) for m in merged])
+    else:
+        results = merged
+    return json.dumps({"page_id": "bench", "comments_analyzed": results, "analytics": analytics})
+
+
+def batch_path(raw, s_preds, t_preds):
+    comments = CommentBatch()
+    for c in raw:
+        author = c.get("from") or {}
+        comments.append(c.get("id"), c.get("message"), c.get("created_time"),
+                        post_id=c["id"].split("_")[0], author_id=author.get("id"), author_name=author.get("name"))
+    comments.set_predictions(s_preds, t_preds)
+    analytics = generate_analytics(comments)
+    return '{"page_id":"bench","comments_analyzed":%s,"analytics":%s}' % (comments.results_json(), json.dumps(analytics))
+
+
+def measure(fn, *args):
+    gc.collect()
+    t0 = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=50000)
+    args = parser.parse_args()
+
+    raw, s_preds, t_preds = make_raw(args.n)
+    print(f"{args.n} comments ({'with' if CommentResult else 'without'} pydantic CommentResult in the dict path)")
+    for name, fn in (("dicts", dict_path), ("CommentBatch", batch_path)):
+        elapsed, peak = measure(fn, raw, s_preds, t_preds)
+        print(f"{name:>13}: {elapsed * 1000:8.1f} ms   peak {peak / 2**20:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
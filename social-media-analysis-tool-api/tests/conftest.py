@@ -0,0 +1,10 @@
+# tests/conftest.py
+import os
+import sys
+from pathlib import Path
+
+# tests import the API package as `app`, like uvicorn does (uvicorn app.main:app)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# importing app.main must not create monitor.db in the working directory
+os.environ.setdefault("MONITOR_DB", ":memory:")
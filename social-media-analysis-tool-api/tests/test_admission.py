@@ -0,0 +1,231 @@
+# tests/test_admission.py
+import asyncio
+
+import pytest
+
+from app.admission import AdmissionController, AdmissionRejected
+
+
+def make(**kw):
+    opts = dict(max_inflight_comments=1000, max_inflight_tokens=10**9, max_request_comments=400,
+                small_comments=50, small_reserve=0.2, max_queue=8, max_wait=1.0,
+                client_comments_per_minute=10**6, client_max_concurrent=10)
+    opts.update(kw)
+    return AdmissionController(**opts)
+
+
+def cost(ctrl, comments):
+    return ctrl._cost(comments, comments)
+
+
+async def hold(ctrl, client, c, started, release, background=False):
+    async with ctrl.admit(client, c, background=background):
+        started.append(client)
+        await release.wait()
+
+
+def test_admit_and_release_restore_budget():
+    async def main():
+        ctrl = make()
+        async with ctrl.admit("a", cost(ctrl, 300)):
+            assert ctrl.status()["inflight_comments"] == 300
+        assert ctrl.status()["inflight_comments"] == 0
+        assert ctrl._large_comments == 0
+
+    asyncio.run(main())
+
+
+def test_large_requests_queue_and_small_ones_use_the_reserve():
+    async def main():
+        ctrl = make()
+        started, release = [], asyncio.Event()
+        first = asyncio.create_task(hold(ctrl, "a", cost(ctrl, 700), started, release))
+        await asyncio.sleep(0)
+        # 700 + 200 > 800 (large share): waits
+        second = asyncio.create_task(hold(ctrl, "b", cost(ctrl, 200), started, release))
+        # small request still fits in the remaining budget, ahead of the queued large one
+        small = asyncio.create_task(hold(ctrl, "c", cost(ctrl, 40), started, release))
+        await asyncio.sleep(0.01)
+        assert started == ["a", "c"]
+        assert ctrl.status()["queued"] == 1
+        release.set()
+        await asyncio.gather(first, second, small)
+        assert started == ["a", "c", "b"]
+        assert ctrl.status()["inflight_comments"] == 0
+
+    asyncio.run(main())
+
+
+def test_oversize_request_runs_alone_instead_of_413():
+    async def main():
+        ctrl = make()
+        started, release = [], asyncio.Event()
+        other = asyncio.create_task(hold(ctrl, "a", cost(ctrl, 100), started, release))
+        await asyncio.sleep(0)
+        huge = asyncio.create_task(hold(ctrl, "b", cost(ctrl, 5000), started, release))
+        await asyncio.sleep(0.01)
+        assert started == ["a"]
+        release.set()
+        await asyncio.gather(other, huge)
+        assert started == ["a", "b"]
+
+        # while it runs it holds the whole large share; small requests still get in
+        release2 = asyncio.Event()
+        huge = asyncio.create_task(hold(ctrl, "b", cost(ctrl, 5000), started, release2))
+        await asyncio.sleep(0)
+        assert ctrl.status()["inflight_comments"] == 800
+        async with ctrl.admit("c", cost(ctrl, 40)):
+            pass
+        release2.set()
+        await huge
+
+    asyncio.run(main())
+
+
+def test_queue_timeout_is_503_and_does_not_leak_budget():
+    async def main():
+        ctrl = make(max_wait=0.02)
+        started, release = [], asyncio.Event()
+        first = asyncio.create_task(hold(ctrl, "a", cost(ctrl, 800), started, release))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as e:
+            async with ctrl.admit("b", cost(ctrl, 100)):
+                pass
+        assert e.value.status_code == 503
+        assert e.value.retry_after >= 1
+        assert ctrl.status()["queued"] == 0
+        release.set()
+        await first
+        assert ctrl.status()["inflight_comments"] == 0
+        assert ctrl._clients["b"].active == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_does_not_leak_budget():
+    async def main():
+        ctrl = make()
+        started, release = [], asyncio.Event()
+        first = asyncio.create_task(hold(ctrl, "a", cost(ctrl, 800), started, release))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold(ctrl, "b", cost(ctrl, 100), started, release))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        release.set()
+        await first
+        status = ctrl.status()
+        assert (status["inflight_comments"], status["queued"]) == (0, 0)
+        assert ctrl._clients["b"].active == 0
+
+    asyncio.run(main())
+
+
+def test_per_client_concurrency_cap():
+    async def main():
+        ctrl = make(client_max_concurrent=1)
+        started, release = [], asyncio.Event()
+        first = asyncio.create_task(hold(ctrl, "a", cost(ctrl, 10), started, release))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as e:
+            async with ctrl.admit("a", cost(ctrl, 10)):
+                pass
+        assert e.value.status_code == 429
+        async with ctrl.admit("b", cost(ctrl, 10)):
+            pass
+        release.set()
+        await first
+
+    asyncio.run(main())
+
+
+def test_client_comment_quota():
+    async def main():
+        ctrl = make(client_comments_per_minute=100)
+        async with ctrl.admit("a", cost(ctrl, 80)):
+            pass
+        with pytest.raises(AdmissionRejected) as e:
+            async with ctrl.admit("a", cost(ctrl, 80)):
+                pass
+        assert e.value.status_code == 429
+        assert e.value.retry_after >= 1
+
+    asyncio.run(main())
+
+
+def test_background_work_skips_client_quota_and_queues_last():
+    async def main():
+        ctrl = make(client_max_concurrent=1)
+        started, release = [], asyncio.Event()
+        blocker = asyncio.create_task(hold(ctrl, "x", cost(ctrl, 800), started, release))
+        await asyncio.sleep(0)
+        bg = [asyncio.create_task(hold(ctrl, "scheduler", cost(ctrl, 100), started, release, background=True))
+              for _ in range(2)]
+        await asyncio.sleep(0)
+        fg = asyncio.create_task(hold(ctrl, "y", cost(ctrl, 100), started, release))
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(blocker, fg, *bg)
+        assert started == ["x", "y", "scheduler", "scheduler"]
+        assert "scheduler" not in ctrl._clients
+
+    asyncio.run(main())
+
+
+def test_scrapes_are_degraded_only_under_load():
+    async def main():
+        ctrl = make()
+        assert ctrl.cap_scrape_comments(300) == 300
+        assert ctrl.cap_scrape_comments(5000) == 5000  # idle node: full request
+        started, release = [], asyncio.Event()
+        busy = asyncio.create_task(hold(ctrl, "a", cost(ctrl, 100), started, release))
+        await asyncio.sleep(0)
+        assert ctrl.cap_scrape_comments(5000) == 400
+        release.set()
+        await busy
+        assert ctrl.cap_scrape_comments(5000) == 5000
+
+    asyncio.run(main())
+
+
+def test_idle_clients_are_pruned(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.admission.time.monotonic", lambda: now[0])
+
+    async def main():
+        ctrl = make(client_comments_per_minute=600)
+        for i in range(50):
+            async with ctrl.admit(f"client-{i}", cost(ctrl, 10)):
+                pass
+        assert ctrl.status()["clients"] == 50
+        now[0] += 120  # buckets refilled
+        async with ctrl.admit("new", cost(ctrl, 10)):
+            pass
+        assert ctrl.status()["clients"] == 1
+
+    asyncio.run(main())
+
+
+def test_small_request_that_fits_is_admitted_with_a_full_queue():
+    async def main():
+        ctrl = make(max_queue=2)
+        started, release = [], asyncio.Event()
+        first = asyncio.create_task(hold(ctrl, "a", cost(ctrl, 700), started, release))
+        await asyncio.sleep(0)
+        waiting = [asyncio.create_task(hold(ctrl, c, cost(ctrl, 200), started, release)) for c in ("b", "d")]
+        await asyncio.sleep(0)
+        assert ctrl.status()["queued"] == 2
+        # large ones are turned away once the queue is full...
+        with pytest.raises(AdmissionRejected) as e:
+            async with ctrl.admit("e", cost(ctrl, 200)):
+                pass
+        assert e.value.status_code == 503
+        # ...but a small one that fits now does not wait behind them
+        async with ctrl.admit("c", cost(ctrl, 10)):
+            assert ctrl.status()["inflight_comments"] == 710
+        release.set()
+        await asyncio.gather(first, *waiting)
+        assert ctrl.status()["inflight_comments"] == 0
+
+    asyncio.run(main())
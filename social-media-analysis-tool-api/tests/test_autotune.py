@@ -0,0 +1,68 @@
+# tests/test_autotune.py
+import pytest
+
+pytest.importorskip("torch")
+
+from app import autotune
+from app.autotune import DEFAULT_CONFIG, best_config, clamp_batch_size, load_config, save_config
+
+TUNED = dict(DEFAULT_CONFIG, batch_size=32, batch_size_min=16, batch_size_max=64)
+
+
+def test_clamp_batch_size():
+    assert clamp_batch_size(None, TUNED) == 32
+    assert clamp_batch_size(48, TUNED) == 48
+    assert clamp_batch_size(1000, TUNED) == 64
+    assert clamp_batch_size(2, TUNED) == 16
+    assert clamp_batch_size(0, TUNED) == 16
+    assert clamp_batch_size(-5, TUNED) == 16
+    assert clamp_batch_size(None, DEFAULT_CONFIG) == DEFAULT_CONFIG["batch_size"]
+
+
+def result(bs, tput, intra=4, inter=1, concurrent=True):
+    return {"batch_size": bs, "intra_op_threads": intra, "inter_op_threads": inter,
+            "concurrent": concurrent, "throughput": tput}
+
+
+def test_best_config_range_uses_the_best_settings_only():
+    results = [
+        result(8, 60), result(16, 85), result(32, 100), result(64, 90), result(128, 70),
+        # fast enough, but measured with other threads / mode: not in the range
+        result(128, 95, intra=2), result(8, 99, concurrent=False), result(256, 81, inter=2),
+    ]
+    config = best_config(results)
+    assert config["batch_size"] == 32
+    assert (config["batch_size_min"], config["batch_size_max"]) == (16, 64)
+    assert (config["intra_op_threads"], config["inter_op_threads"], config["concurrent"]) == (4, 1, True)
+    assert config["throughput"] == 100
+
+
+def test_best_config_with_a_single_measurement():
+    config = best_config([result(32, 10, concurrent=False)])
+    assert (config["batch_size"], config["batch_size_min"], config["batch_size_max"]) == (32, 32, 32)
+    assert config["concurrent"] is False
+
+
+def test_save_and_load_config_per_backend(tmp_path, monkeypatch):
+    path = str(tmp_path / "tuning" / "autotune.json")
+    assert load_config(-1, path) is None
+
+    cpu = dict(TUNED, concurrent=False)
+    gpu = dict(TUNED, batch_size=128, batch_size_max=256)
+    save_config(cpu, -1, path)
+    save_config(gpu, 0, path)
+    assert load_config(-1, path) == cpu
+    assert load_config(0, path) == gpu
+    assert "/cpu/" in autotune.backend_key(-1) and "/cuda:0/" in autotune.backend_key(0)
+
+    # another host (or torch version) does not pick up this host's tuning
+    monkeypatch.setattr(autotune.socket, "gethostname", lambda: "other-host")
+    assert load_config(-1, path) is None
+
+
+def test_load_config_ignores_a_corrupt_file(tmp_path):
+    path = tmp_path / "autotune.json"
+    path.write_text("{not json")
+    assert load_config(-1, str(path)) is None
+    save_config(TUNED, -1, str(path))
+    assert load_config(-1, str(path)) == TUNED
@@ -0,0 +1,58 @@
+# tests/test_batch.py
+import json
+import math
+
+import pytest
+
+from app.batch import CommentBatch
+from app.utils import generate_analytics, merge_model_outputs
+
+ROWS = [
+    {"comment_id": "1", "text": 'say "hi"\n', "created_time": "2025-09-06T12:00:00+0000"},
+    {"comment_id": "2", "text": "café \U0001f600", "created_time": None},
+    {"comment_id": "1", "text": "duplicate id", "created_time": None},
+]
+S_PREDS = [{"label": "positive", "score": 0.91}, [{"label": "negative", "score": 0.5}], "garbage"]
+T_PREDS = [{"label": "service", "score": 0.25}, {"label": "price", "score": 1.0}, {"label": "price"}]
+
+
+def test_results_json_matches_the_dict_path():
+    batch = CommentBatch.from_dicts(ROWS).set_predictions(S_PREDS, T_PREDS)
+    expected = merge_model_outputs(ROWS, S_PREDS, T_PREDS)
+    got = json.loads(batch.results_json())
+    assert len(got) == len(expected)
+    for g, e in zip(got, expected):
+        for field in ("comment_id", "text", "sentiment", "category", "created_time"):
+            assert g[field] == e[field]
+        for field in ("sentiment_conf", "category_conf"):
+            if e[field] is None:
+                assert g[field] is None
+            else:
+                # float32 storage
+                assert math.isclose(g[field], e[field], rel_tol=1e-6)
+    assert generate_analytics(batch) == generate_analytics(expected)
+
+
+def test_results_json_without_predictions():
+    got = json.loads(CommentBatch.from_dicts(ROWS).results_json())
+    assert [r["sentiment"] for r in got] == [None, None, None]
+    assert [r["comment_id"] for r in got] == ["1", "2", "1"]
+
+
+def test_results_json_rejects_missing_comment_id():
+    batch = CommentBatch()
+    batch.append("1", "ok")
+    batch.append(None, "no id")
+    with pytest.raises(ValueError):
+        batch.results_json()
+
+
+def test_dedupe_and_slice_keep_columns_aligned():
+    batch = CommentBatch.from_dicts(ROWS).set_predictions(S_PREDS, T_PREDS)
+    unique = batch.dedupe()
+    assert unique.comment_id == ["1", "2"]
+    assert unique.sentiment == ["positive", "negative"]
+    assert list(unique.category_conf) == [0.25, 1.0]
+    part = batch.slice(1, 3)
+    assert part.text == [ROWS[1]["text"], ROWS[2]["text"]]
+    assert part.row(1)["sentiment"] is None and part.row(1)["category"] == "price"
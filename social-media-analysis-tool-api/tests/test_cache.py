@@ -0,0 +1,97 @@
+# tests/test_cache.py
+import asyncio
+
+import pytest
+
+from app.cache import ResponseCache, SingleFlight, make_key, token_digest
+
+
+def test_single_flight_runs_once_for_concurrent_callers():
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(*(flight.do("k", compute) for _ in range(5)))
+
+    assert asyncio.run(main()) == [1] * 5
+    assert calls == 1
+
+
+def test_single_flight_shares_errors_and_forgets_the_key():
+    calls = 0
+
+    async def boom():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(flight.do("k", boom), flight.do("k", boom), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+        # the failed flight is not remembered: the next call runs again
+        with pytest.raises(ValueError):
+            await flight.do("k", boom)
+
+    asyncio.run(main())
+    assert calls == 2
+
+
+def test_single_flight_cancelled_follower_does_not_cancel_leader():
+    async def main():
+        flight = SingleFlight()
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        leader = asyncio.create_task(flight.do("k", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("k", slow))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        assert await leader == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+
+    asyncio.run(main())
+
+
+def test_response_cache_ttl_and_lru(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.cache.time.monotonic", lambda: now[0])
+    cache = ResponseCache(ttl=10, max_entries=2)
+    cache.set("a", b"A")
+    cache.set("b", b"B")
+    assert cache.get("a") == b"A"  # a is now most recently used
+    cache.set("c", b"C")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"A"
+    now[0] += 11
+    assert cache.get("a") is None
+
+
+def test_make_key_distinguishes_none_and_empty():
+    assert make_key("x", None) != make_key("x", "")
+    assert make_key("x", 1, 2) == make_key("x", 1, 2)
+
+
+def test_token_digest_does_not_contain_the_token():
+    token = "EAAB-secret-token"
+    assert token not in token_digest(token)
+    assert token_digest(token) != token_digest(token + "x")
+
+
+def test_response_cache_keeps_meta_with_the_payload():
+    cache = ResponseCache(ttl=10)
+    cache.set("k", b"body", "analysis-1")
+    assert cache.get_entry("k") == (b"body", "analysis-1")
+    assert cache.get("k") == b"body"
+    assert cache.get_entry("missing") is None
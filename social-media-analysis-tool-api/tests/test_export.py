@@ -0,0 +1,137 @@
+# tests/test_export.py
+import csv
+import gzip
+import io
+
+import pytest
+
+from app.batch import CommentBatch
+from app.export import BOM, COMMENT_COLUMNS, build_report, gzip_stream, iter_categories_csv, iter_comments_csv
+from app.utils import generate_analytics
+
+ROWS = [
+    {"comment_id": "1", "text": 'say "hi",\nthen leave', "created_time": "2025-08-30T12:00:00+0000"},
+    {"comment_id": "2", "text": "great staff", "created_time": "2025-09-06T12:00:00+0000"},
+    {"comment_id": "3", "text": "too pricey", "created_time": None},
+    {"comment_id": "4", "text": "ok I guess", "created_time": "2025-09-07T08:00:00+0000"},
+    {"comment_id": "5", "text": "café \U0001f600", "created_time": "2025-09-08T08:00:00+0000"},
+]
+S_PREDS = [{"label": "negative", "score": 0.8}, {"label": "positive", "score": 0.9},
+           {"label": "negative", "score": 0.7}, {"label": "neutral", "score": 0.6}, {"label": "positive"}]
+T_PREDS = [{"label": "service", "score": 0.5}, {"label": "service", "score": 0.75},
+           {"label": "price", "score": 0.5}, {"label": "price", "score": 0.5}, {"label": "service", "score": 0.5}]
+
+
+def analyzed():
+    comments = CommentBatch.from_dicts(ROWS).set_predictions(S_PREDS, T_PREDS)
+    return comments, generate_analytics(comments)
+
+
+def test_comments_csv_chunks_split_on_row_boundaries():
+    comments, _ = analyzed()
+    chunks = list(iter_comments_csv(comments, chunk_rows=2))
+    assert len(chunks) == 3
+    assert chunks[0].startswith(BOM)
+    # every chunk ends on a row boundary, and chunking does not change the output
+    assert all(c.endswith("\n") for c in chunks)
+    assert "".join(chunks) == "".join(iter_comments_csv(comments, chunk_rows=1000))
+
+    rows = list(csv.reader(io.StringIO("".join(chunks)[len(BOM):])))
+    assert rows[0] == COMMENT_COLUMNS
+    assert [r[0] for r in rows[1:]] == ["1", "2", "3", "4", "5"]
+    assert rows[1][-1] == ROWS[0]["text"]
+    assert rows[2][2:6] == ["positive", "0.9000", "service", "0.7500"]
+    assert rows[3][1] == ""  # no created_time
+
+
+def test_comments_csv_without_predictions_or_rows():
+    rows = list(csv.reader(io.StringIO("".join(iter_comments_csv(CommentBatch.from_dicts(ROWS[:1]))))))
+    assert rows[1][2:6] == ["", "", "", ""]
+    assert "".join(iter_comments_csv(CommentBatch())) == BOM + ",".join(COMMENT_COLUMNS) + "\n"
+
+
+def test_categories_csv():
+    _, analytics = analyzed()
+    rows = list(csv.reader(io.StringIO("".join(iter_categories_csv(analytics))[len(BOM):])))
+    assert rows[0][0] == "category"
+    assert sorted(r[0] for r in rows[1:]) == ["price", "service"]
+
+
+def test_gzip_stream_round_trip():
+    comments, _ = analyzed()
+    chunks = list(iter_comments_csv(comments, chunk_rows=1))
+    assert gzip.decompress(b"".join(gzip_stream(iter(chunks)))) == "".join(chunks).encode("utf-8")
+    assert gzip.decompress(b"".join(gzip_stream(iter([])))) == b""
+
+
+def test_build_report():
+    comments, analytics = analyzed()
+    report = build_report("42", comments, analytics, samples=2)
+    summary = report["summary"]
+    assert summary["total_comments"] == 5
+    assert (summary["positive_pct"], summary["neutral_pct"], summary["negative_pct"]) == (40, 20, 40)
+    assert summary["date_range"] == {"start": "2025-08-30T12:00:00+0000", "end": "2025-09-08T08:00:00+0000"}
+    assert summary["top_topics"] == ["service", "price"]
+    assert report["timeline"] == [
+        {"month": "2025-08", "positive": 0, "neutral": 0, "negative": 1},
+        {"month": "2025-09", "positive": 2, "neutral": 1, "negative": 0},
+    ]
+    assert [c["comment_id"] for c in report["sample_comments"]] == ["1", "2"]
+
+
+def test_build_report_of_an_empty_analysis():
+    empty = CommentBatch()
+    report = build_report("42", empty, generate_analytics(empty))
+    assert report["summary"]["positive_pct"] == 0
+    assert report["summary"]["date_range"] == {"start": None, "end": None}
+    assert report["timeline"] == [] and report["sample_comments"] == []
+
+
+@pytest.fixture
+def api():
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+    from app import main
+    return main, TestClient(main.app)
+
+
+def test_accept_encoding_negotiation(api):
+    main, _ = api
+    assert main._accepts_gzip("gzip, deflate, br")
+    assert main._accepts_gzip("deflate, gzip;q=0.5")
+    assert main._accepts_gzip("*")
+    assert not main._accepts_gzip("")
+    assert not main._accepts_gzip("gzip;q=0")
+    assert not main._accepts_gzip("gzip; q=0.0, identity")
+    assert not main._accepts_gzip("*, gzip;q=0")
+    assert not main._accepts_gzip("identity")
+
+
+def test_comments_csv_endpoint_gzip(api):
+    main, client = api
+    comments, analytics = analyzed()
+    main.ANALYSES.put("export-test", "42", comments, analytics)
+    expected = "".join(iter_comments_csv(comments))
+
+    r = client.get("/analyses/export-test/comments.csv", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip" and "Accept-Encoding" in r.headers["vary"]
+    assert r.text == expected  # decoded by the client
+
+    r = client.get("/analyses/export-test/comments.csv", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "content-encoding" not in r.headers and "Accept-Encoding" in r.headers["vary"]
+    assert r.text == expected
+
+    r = client.get("/analyses/export-test/report")
+    assert r.json()["summary"]["total_comments"] == 5
+
+
+def test_unknown_or_expired_analysis_is_404(api, monkeypatch):
+    main, client = api
+    for path in ("comments.csv", "categories.csv", "comments.xlsx", "report"):
+        assert client.get(f"/analyses/no-such-id/{path}").status_code == 404
+
+    comments, analytics = analyzed()
+    monkeypatch.setattr(main.ANALYSES, "ttl", -1.0)
+    main.ANALYSES.put("expired", "42", comments, analytics)
+    assert client.get("/analyses/expired/report").status_code == 404
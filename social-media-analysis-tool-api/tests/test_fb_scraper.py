@@ -0,0 +1,122 @@
+# tests/test_fb_scraper.py
+import asyncio
+
+import pytest
+
+from app import fb_scraper
+from app.fb_scraper import MIN_PAGE_SIZE, allocate_budget, fetch_all_comments, page_size
+
+
+def test_allocate_budget_is_proportional_and_exact():
+    alloc = allocate_budget(100, [300, 100, 100])
+    assert alloc == [60, 20, 20]
+    assert sum(allocate_budget(1000, [7, 333, 2, 901, 45])) == 1000
+
+
+def test_allocate_budget_never_exceeds_demand():
+    for budget, demands in [(100, [10, 20]), (100, [5, 1000, 1000]), (7, [3, 3, 3]), (100, [0, 0]), (0, [10])]:
+        alloc = allocate_budget(budget, demands)
+        assert all(0 <= a <= d for a, d in zip(alloc, demands))
+        assert sum(alloc) == min(budget, sum(demands))
+
+
+def test_page_size_avoids_tiny_tail_requests():
+    assert page_size(1) == MIN_PAGE_SIZE
+    assert page_size(60) == 60
+    assert page_size(100) == 100
+    assert page_size(130) == 65
+    assert page_size(1000) == 100
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeGraph:
+    """Minimal Graph API: posts with comment totals, cursor-paged comments, optional 429s."""
+
+    def __init__(self, totals, rate_limited=0, reported=None):
+        self.totals = totals
+        self.reported = reported or totals
+        self.rate_limited = rate_limited
+        self.requests = 0
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get(self, url, params=None, timeout=None):
+        self.requests += 1
+        if self.rate_limited:
+            self.rate_limited -= 1
+            return FakeResponse(429, {"error": {"code": 4, "message": "rate limited"}})
+        path = url[len(fb_scraper.FB_API_BASE):]
+        if path == "/mypage":
+            return FakeResponse(200, {"id": "42"})
+        if path == "/42/posts":
+            posts = [
+                {"id": f"p{i}", "comments": {"data": [], "summary": {"total_count": n}}}
+                for i, n in enumerate(self.reported)
+            ]
+            return FakeResponse(200, {"data": posts})
+        post = path.split("/")[1]
+        total = self.totals[int(post[1:])]
+        start = int(params.get("after", 0))
+        end = min(total, start + params["limit"])
+        data = [{"id": f"{post}_{i}", "message": f"comment {i}", "created_time": "2025-09-06T12:00:00+0000"}
+                for i in range(start, end)]
+        data.append({"message": "no id"})  # skipped: cannot be returned without a comment_id
+        paging = {"cursors": {"after": str(end)}}
+        if end < total:
+            paging["next"] = "https://graph.facebook.com/next"
+        return FakeResponse(200, {"data": data, "paging": paging})
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    def install(totals, rate_limited=0, reported=None):
+        fake = FakeGraph(totals, rate_limited, reported)
+        monkeypatch.setattr(fb_scraper.httpx, "AsyncClient", fake)
+
+        async def no_sleep(_):
+            pass
+
+        monkeypatch.setattr(fb_scraper.asyncio, "sleep", no_sleep)
+        return fake
+
+    return install
+
+
+def test_fetch_all_comments_follows_demand_and_counts_requests(graph):
+    fake = graph([600, 200, 100, 50, 10], rate_limited=1)
+    out = asyncio.run(fetch_all_comments("mypage", "token-xxxxxxxx", max_posts=5, max_comments=500))
+    assert out["total_fetched"] == 500
+    assert None not in out["comments"].comment_id
+    per_post = [out["comments"].post_id.count(f"p{i}") for i in range(5)]
+    # split by demand: the busiest post gets the most, nobody gets more than it has
+    assert per_post == sorted(per_post, reverse=True)
+    assert per_post[0] > 250 and all(n <= total for n, total in zip(per_post, [600, 200, 100, 50, 10]))
+    # measured, not estimated: every request the fake served, the 429 retry included
+    assert out["graph_requests"] == fake.requests
+    assert out["requests_per_comment"] == round(fake.requests / 500, 4)
+
+
+def test_fetch_all_comments_reallocates_budget_of_short_posts(graph):
+    # p0 claims 500 comments but only has 30: its unused budget goes to p1
+    graph([30, 1000], reported=[500, 1000])
+    out = asyncio.run(fetch_all_comments("42", "token-xxxxxxxx", max_posts=2, max_comments=400))
+    assert out["total_fetched"] == 400
+    assert out["comments"].post_id.count("p0") == 30
@@ -0,0 +1,76 @@
+# tests/test_monitor_api.py
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient
+
+from app import main
+from app.batch import CommentBatch
+from app.schemas import MonitorPage
+
+ALICE = "token-aaaaaaaa"
+MALLORY = "token-mmmmmmmm"
+
+
+@pytest.fixture
+def client():
+    main.RESPONSE_CACHE.clear()
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def scrapes(monkeypatch):
+    calls = []
+
+    async def fake_scrape(req):
+        calls.append(req.page)
+        comments = CommentBatch.from_dicts([{"comment_id": "c1", "text": "good staff"}])
+        comments.set_predictions([{"label": "positive", "score": 0.9}], [{"label": "service", "score": 0.5}])
+        return "42", comments, None
+
+    monkeypatch.setattr(main, "_scrape_analyze", fake_scrape)
+    return calls
+
+
+def register(client, name, token):
+    r = client.post("/monitor/pages", json={"pages": [{"graph_api_key": token, "page": name}]})
+    assert r.status_code == 200
+
+
+def test_monitor_results_need_the_page_token(client):
+    register(client, "alicepage", ALICE)
+    main.RESULT_STORE.put("alicepage", b'{"page_id":"42"}')
+
+    assert client.get("/monitor/results/alicepage").status_code == 422
+    assert client.get("/monitor/results/alicepage", headers={"X-Graph-Api-Key": MALLORY}).status_code == 404
+    r = client.get("/monitor/results/alicepage", headers={"X-Graph-Api-Key": ALICE})
+    assert r.status_code == 200 and r.json() == {"page_id": "42"}
+
+    assert client.delete("/monitor/pages/alicepage", headers={"X-Graph-Api-Key": MALLORY}).status_code == 404
+    assert main.RESULT_STORE.get("alicepage") is not None
+    assert client.delete("/monitor/pages/alicepage", headers={"X-Graph-Api-Key": ALICE}).status_code == 200
+    assert main.RESULT_STORE.get("alicepage") is None
+    assert client.get("/monitor/results/alicepage", headers={"X-Graph-Api-Key": ALICE}).status_code == 404
+
+
+def test_scheduled_refreshes_are_not_exported(client, scrapes):
+    spec = MonitorPage(graph_api_key=ALICE, page="refreshed", max_comments=50)
+    before = len(main.ANALYSES._entries)
+    body = json.loads(asyncio.run(main._monitor_page(spec)))
+    assert body["analysis_id"] is None
+    assert len(main.ANALYSES._entries) == before
+
+    # a dashboard request does not reuse the refresh: it needs an analysis id for exports
+    r = client.post("/scrape-analyze", json={"graph_api_key": ALICE, "page": "refreshed", "max_comments": 50})
+    analysis_id = r.headers["X-Analysis-Id"]
+    assert r.json()["analysis_id"] == analysis_id
+    assert scrapes == ["refreshed", "refreshed"]
+
+    # the next refresh reuses the dashboard's run, without its export id
+    body = json.loads(asyncio.run(main._monitor_page(spec)))
+    assert body["analysis_id"] is None
+    assert body["comments_analyzed"][0]["comment_id"] == "c1"
+    assert scrapes == ["refreshed", "refreshed"]
@@ -0,0 +1,165 @@
+# tests/test_scheduler.py
+import asyncio
+import time
+
+from app.scheduler import PageScheduler
+from app.schemas import MonitorPage
+from app.store import ResultStore
+
+
+def page(name, token="token-aaaaaaaa", interval=3600):
+    return MonitorPage(graph_api_key=token, page=name, interval_seconds=interval, max_posts=5, max_comments=100)
+
+
+class Runner:
+    """run_page stand-in: records what started and blocks until released."""
+
+    def __init__(self):
+        self.started = []
+        self.release = asyncio.Event()
+        self.fail = set()
+
+    async def __call__(self, spec):
+        self.started.append(spec.page)
+        await self.release.wait()
+        if spec.page in self.fail:
+            raise RuntimeError("scrape failed")
+        return f'{{"page_id":"{spec.page}"}}'.encode()
+
+
+def scheduler(runner, store=None, **kw):
+    opts = dict(max_concurrency=3, max_per_token=2, first_run_jitter=0)
+    opts.update(kw)
+    return PageScheduler(runner, store or ResultStore(), **opts)
+
+
+def test_dispatch_is_round_robin_across_tokens_and_capped_per_token():
+    async def main():
+        runner = Runner()
+        sched = scheduler(runner)
+        sched.set_pages([page(f"a{i}", token="token-aaaaaaaa") for i in range(6)] + [page("b0", token="token-bbbbbbbb")])
+        sched._enqueue_due(time.time())
+        sched._dispatch()
+        await asyncio.sleep(0)
+        # token a may only run 2 at once; token b is not starved by a's backlog
+        assert sorted(runner.started) == ["a0", "a1", "b0"]
+        runner.release.set()
+        await asyncio.gather(*sched._tasks)
+        assert sched._active == 0 and not sched._active_per_token
+        assert sched.store.get("a0")["result"] == b'{"page_id":"a0"}'
+
+    asyncio.run(main())
+
+
+def test_refreshed_pages_are_not_due_until_interval_passes():
+    async def main():
+        runner = Runner()
+        runner.release.set()
+        sched = scheduler(runner)
+        sched.set_pages([page("p", interval=600)])
+        now = time.time()
+        sched.store.put("p", b"{}", refreshed_at=now - 60)
+        sched._enqueue_due(now)
+        assert not any(sched._queues.values())
+        sched._enqueue_due(now + 600)
+        assert [j.key for j in sched._queues[sched._jobs["p"].token_key]] == ["p"]
+
+    asyncio.run(main())
+
+
+def test_failed_refresh_is_deferred():
+    async def main():
+        runner = Runner()
+        runner.fail.add("p")
+        runner.release.set()
+        sched = scheduler(runner, retry_seconds=120)
+        sched.set_pages([page("p")])
+        sched._enqueue_due(time.time())
+        sched._dispatch()
+        await asyncio.gather(*sched._tasks)
+        job = sched._jobs["p"]
+        assert job.state == "idle"
+        assert job.last_error == "scrape failed"
+        assert job.not_before > time.time() + 100
+        assert sched.store.get("p") is None
+
+    asyncio.run(main())
+
+
+def test_first_runs_are_spread_by_jitter():
+    sched = scheduler(Runner(), first_run_jitter=300)
+    before = time.time()
+    sched.set_pages([page(f"p{i}") for i in range(50)])
+    due = [job.not_before for job in sched._jobs.values()]
+    assert all(before <= d <= before + 301 for d in due)
+    assert max(due) - min(due) > 60
+
+
+def test_pages_and_refresh_times_survive_a_restart(tmp_path):
+    path = str(tmp_path / "monitor.db")
+    store = ResultStore(path)
+    sched = scheduler(Runner(), store, first_run_jitter=300)
+    sched.set_pages([page("done"), page("never"), page("gone")])
+    sched.remove_page("gone")
+    refreshed = time.time() - 10
+    store.put("done", b'{"page_id":"done"}', refreshed_at=refreshed)
+
+    store = ResultStore(path)
+    sched = scheduler(Runner(), store, first_run_jitter=300)
+    assert sorted(sched._jobs) == ["done", "never"]
+    assert store.last_refreshed("done") == refreshed
+    assert store.get("done")["result"] == b'{"page_id":"done"}'
+    # the refreshed page keeps its schedule; the other one gets a jittered first run
+    assert sched._jobs["done"].not_before == 0.0
+    assert sched._jobs["never"].not_before > 0.0
+    sched._enqueue_due(time.time())
+    assert not any(sched._queues.values())
+
+
+def test_removed_pages_drop_their_result():
+    sched = scheduler(Runner())
+    sched.set_pages([page("a"), page("b")])
+    sched.store.put("a", b"{}")
+    sched.store.put("b", b"{}")
+    sched.remove_page("a")
+    assert sched.store.get("a") is None and sched.store.last_refreshed("a") is None
+    # replace drops the other pages of the same token, and their results
+    sched.set_pages([page("c")], replace=True)
+    assert sorted(sched._jobs) == ["c"]
+    assert sched.store.get("b") is None
+
+
+def test_replace_keeps_pages_of_other_tokens():
+    sched = scheduler(Runner())
+    sched.set_pages([page("alice", token="token-aaaaaaaa"), page("bob", token="token-bbbbbbbb")])
+    sched.set_pages([page("alice2", token="token-aaaaaaaa")], replace=True)
+    assert sorted(sched._jobs) == ["alice2", "bob"]
+
+
+def test_pages_are_owned_by_their_token():
+    sched = scheduler(Runner())
+    sched.set_pages([page("alice", token="token-aaaaaaaa")])
+    assert sched.owned_by("alice", "token-aaaaaaaa")
+    assert not sched.owned_by("alice", "token-bbbbbbbb")
+    assert not sched.owned_by("nobody", "token-aaaaaaaa")
+    # re-registered with another token: the result scraped with the old one is dropped
+    sched.store.put("alice", b"{}")
+    sched.set_pages([page("alice", token="token-bbbbbbbb")])
+    assert sched.owned_by("alice", "token-bbbbbbbb")
+    assert sched.store.get("alice") is None
+
+
+def test_refresh_finishing_after_a_token_change_is_not_stored():
+    async def main():
+        runner = Runner()
+        sched = scheduler(runner)
+        sched.set_pages([page("p", token="token-aaaaaaaa")])
+        sched._enqueue_due(time.time())
+        sched._dispatch()
+        await asyncio.sleep(0)
+        sched.set_pages([page("p", token="token-bbbbbbbb")])
+        runner.release.set()
+        await asyncio.gather(*sched._tasks)
+        assert sched.store.get("p") is None
+
+    asyncio.run(main())
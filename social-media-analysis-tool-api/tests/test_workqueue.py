@@ -0,0 +1,191 @@
+# tests/test_workqueue.py
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from app.batch import CommentBatch
+from app.utils import analyze_comments, predict_texts
+from app.workqueue import SQLiteWorkQueue, WorkQueue, WorkQueueError, analyze_comments_queued
+
+
+class FakeModels:
+    """Pipelines stand-in: deterministic labels, no model files needed."""
+
+    @staticmethod
+    def sentiment_pipe(texts, truncation=True):
+        return [{"label": "positive" if "good" in t else "negative", "score": 0.9} for t in texts]
+
+    @staticmethod
+    def topics_pipe(texts, truncation=True):
+        return [{"label": "service" if "staff" in t else "price", "score": 0.5} for t in texts]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteWorkQueue(str(tmp_path / "queue.db"), lease_seconds=60)
+
+
+def test_work_queue_is_abstract():
+    with pytest.raises(TypeError):
+        WorkQueue()
+
+
+def test_claim_complete_and_progress(queue):
+    job = queue.submit([["a", "b"], ["c"]])
+    assert queue.progress(job) == {"total": 2, "done": 0, "error": None}
+    first, second = queue.claim(), queue.claim()
+    assert (first.seq, first.texts) == (0, ["a", "b"])
+    assert (second.seq, second.texts) == (1, ["c"])
+    assert queue.claim() is None
+    queue.complete(second, ["s"], ["t"])
+    assert queue.progress(job)["done"] == 1
+    queue.complete(first, ["s1", "s2"], ["t1", "t2"])
+    assert queue.results(job) == {0: (["s1", "s2"], ["t1", "t2"]), 1: (["s"], ["t"])}
+    queue.delete(job)
+    assert queue.progress(job) == {"total": 0, "done": 0, "error": None}
+
+
+def test_expired_lease_is_claimable_again(queue, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.workqueue.time.time", lambda: now[0])
+    queue.submit([["a"]])
+    task = queue.claim()
+    assert queue.claim() is None
+    now[0] += 61  # worker died holding the lease
+    again = queue.claim()
+    assert again.task_id == task.task_id
+
+
+def test_abandoned_jobs_expire(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.workqueue.time.time", lambda: now[0])
+    queue = SQLiteWorkQueue(str(tmp_path / "queue.db"), lease_seconds=60, job_ttl=600)
+    job = queue.submit([["a"], ["b"], ["c"]])
+    queue.complete(queue.claim(), ["s"], ["t"])
+    queue.claim()
+    # the API died: nobody polls or deletes the job
+    now[0] += 601
+    assert queue.claim() is None
+    assert queue.progress(job) == {"total": 0, "done": 0, "error": None}
+    fresh = queue.submit([["d"]])
+    assert queue.claim().job_id == fresh
+
+
+def test_queue_files_without_created_at_are_migrated(tmp_path):
+    path = str(tmp_path / "queue.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE tasks (task_id TEXT PRIMARY KEY, job_id TEXT NOT NULL, seq INTEGER NOT NULL, payload TEXT NOT NULL,"
+        " status TEXT NOT NULL DEFAULT 'pending', claimed_at REAL, result TEXT, error TEXT)"
+    )
+    conn.execute("INSERT INTO tasks (task_id, job_id, seq, payload) VALUES ('old:0', 'old', 0, '[\"x\"]')")
+    conn.commit()
+    conn.close()
+    queue = SQLiteWorkQueue(path)
+    # leftovers of the old schema have no age: treated as expired
+    assert queue.claim() is None
+    job = queue.submit([["a"]])
+    assert queue.claim().job_id == job
+
+
+def test_failed_batch_is_reported(queue):
+    job = queue.submit([["a"], ["b"]])
+    queue.fail(queue.claim(), "CUDA out of memory")
+    assert queue.progress(job)["error"] == "CUDA out of memory"
+
+
+def test_concurrent_claims_never_share_a_task(queue):
+    queue.submit([[str(i)] for i in range(40)])
+    claimed = []
+
+    def worker():
+        while True:
+            task = queue.claim()
+            if task is None:
+                return
+            claimed.append(task.task_id)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(claimed) == 40 and len(set(claimed)) == 40
+
+
+def _run_worker(queue, stop, batch_size=3):
+    # like app.worker: tasks are re-chunked to the worker's own batch size
+    while not stop.is_set():
+        task = queue.claim()
+        if task is None:
+            stop.wait(0.01)
+            continue
+        queue.complete(task, *predict_texts(FakeModels, task.texts, batch_size, concurrent=False))
+
+
+def test_queued_analysis_matches_in_process(queue):
+    texts = [f"comment {i} " + ("good staff" if i % 3 else "bad price") for i in range(50)]
+    batch = CommentBatch()
+    for i, t in enumerate(texts):
+        batch.append(f"c{i}", t)
+
+    stop = threading.Event()
+    worker = threading.Thread(target=_run_worker, args=(queue, stop))
+    worker.start()
+    try:
+        queued, queued_analytics = asyncio.run(
+            analyze_comments_queued(queue, batch, batch_size=8, timeout=10, poll_interval=0.01)
+        )
+    finally:
+        stop.set()
+        worker.join()
+
+    expected = CommentBatch.from_dicts([{"comment_id": f"c{i}", "text": t} for i, t in enumerate(texts)])
+    expected, analytics = analyze_comments(FakeModels, expected, batch_size=8, concurrent=False)
+    assert queued.results_json() == expected.results_json()
+    assert queued_analytics == analytics
+
+
+def test_queued_analysis_times_out_and_drops_the_job(queue):
+    batch = CommentBatch()
+    batch.append("c1", "nobody is listening")
+    with pytest.raises(WorkQueueError):
+        asyncio.run(analyze_comments_queued(queue, batch, timeout=0.05, poll_interval=0.01))
+    assert queue.claim() is None
+
+
+class FlakyQueue:
+    """Wraps a queue; the listed calls raise once, like a dropped Redis connection."""
+
+    def __init__(self, queue, failing):
+        self.queue = queue
+        self.failing = list(failing)
+
+    def __getattr__(self, name):
+        method = getattr(self.queue, name)
+
+        def call(*args):
+            if name in self.failing:
+                self.failing.remove(name)
+                raise ConnectionError(f"{name}: connection reset")
+            return method(*args)
+
+        return call
+
+
+def test_worker_survives_queue_errors(queue, monkeypatch):
+    pytest.importorskip("transformers")
+    from app import worker
+
+    sleeps = []
+    monkeypatch.setattr(worker.time, "sleep", sleeps.append)
+    job = queue.submit([["good staff"], ["bad price"]])
+    flaky = FlakyQueue(queue, ["claim", "claim", "complete"])
+    tuning = {"batch_size": 8, "concurrent": False}
+    assert worker.process_tasks(flaky, FakeModels, tuning, poll_interval=0.5, max_tasks=2) == 2
+    # two failed claims back off exponentially; the failed report backs off too
+    assert sleeps == [0.5, 1.0, 2.0]
+    # the first batch's outcome was lost: it stays leased until another worker redoes it
+    assert queue.progress(job)["done"] == 1